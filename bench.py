@@ -0,0 +1,274 @@
+"""
+Benchmarks of the homemade engine.
+
+Run `python bench.py eval` to measure how many evaluations per second each term of `eval.py` reaches on a fixed set
+of positions, `python bench.py nnue` to compare the network of `nnue.py` with it, and `python bench.py profile` to see
+where a search of those positions spends its time. `python bench.py perft` counts the moves of the usual perft test
+positions with `chess.Board`, and `python bench.py search` searches 50 positions to a fixed depth and prints the total
+number of nodes, which only changes when the search does. The positions never change, so numbers from different
+commits on the same machine can be compared.
+"""
+import argparse
+import cProfile
+import pstats
+import time
+from collections.abc import Callable
+import chess
+from chess.engine import Limit
+import eval
+import nnue
+from search import Searcher
+from transposition import TranspositionTable
+
+BENCH_FENS = [
+    chess.STARTING_FEN,
+    "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3",
+    "r1bq1rk1/ppp2ppp/2np1n2/2b1p3/2B1P3/2NP1N2/PPP2PPP/R1BQ1RK1 w - - 0 7",
+    "r1bqkb1r/pp3ppp/2nppn2/6B1/3NP3/2N5/PPP2PPP/R2QKB1R w KQkq - 0 7",
+    "rnbq1rk1/ppp1ppbp/3p1np1/8/2PPP3/2N2N2/PP2BPPP/R1BQK2R b KQ - 3 6",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "2r2rk1/pp1bqppp/2nbpn2/3p4/3P4/2PBPN2/PP1NQPPP/R4RK1 w - - 5 12",
+    "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+    "8/8/4k3/3p4/3P4/4K3/8/8 w - - 0 1",
+    "6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1",
+    "8/5pk1/6p1/7p/P6P/6P1/5PK1/8 b - - 0 40",
+    "r1b2rk1/2q1b1pp/p2ppn2/1p6/3QP3/1BN1B3/PPP3PP/R4RK1 w - - 0 1",
+    "4rrk1/pp1n3p/3q2pQ/2p1pb2/2PP4/2P3N1/P2B2PP/4RRK1 b - - 7 19",
+    "3r1k2/4npp1/1ppr3p/p6P/P2PPPP1/1NR5/5K2/2R5 w - - 0 1",
+    "8/8/1P6/5pr1/8/4R3/7k/2K5 w - - 0 1",
+]
+
+# More positions from the middle and end of games, for the search benchmark.
+SEARCH_FENS = [
+    *BENCH_FENS,
+    "r1b1k2r/pp1p1p1p/3b1np1/2q1p3/2P1P2P/P1N1BN2/1PP1QPP1/1R3RK1 b kq - 0 12",
+    "r1b1r1k1/p1bp1p1p/p4np1/2P1p1B1/4P2P/P1N2N2/1PP2PP1/1R2R1K1 w - - 0 18",
+    "N1b5/p3rpkp/p1p3p1/4p3/4P2P/P4N2/1PP2PP1/3RR1K1 b - - 1 23",
+    "N7/pb2rpkp/3R2p1/2P1p3/p1P1P2P/P4N2/5PP1/4R1K1 w - - 2 29",
+    "r7/p1P2p2/5kp1/3Pp2p/p3P2P/P4N1K/5PP1/4R3 b - - 1 34",
+    "8/p3kp2/6p1/3PN1Pp/p3P2P/P3r2K/5P2/8 w - - 0 40",
+    "8/3k4/8/p2P2Pp/p3KN1P/P3P3/8/8 b - - 2 45",
+    "rnb1kb1r/3pp1pp/p3qn2/PBp5/8/2NPBp1P/1PP2PP1/R2QK1R1 b Qkq - 1 12",
+    "1r2kb1r/3p1qpp/nN3n2/Ppp1p3/8/3PB2P/1PP2PR1/R2QK3 w Qk - 0 18",
+    "1r3rk1/3p1qpp/1N1b4/Ppp1p3/1n3nQ1/3PB2P/1PP2PR1/2K3R1 b - - 11 23",
+    "1r3r1k/6p1/8/Ppp4p/1n3bQ1/3PB2P/qPP2PR1/2K5 w - - 4 29",
+    "1r3B1k/6p1/8/qp5p/1n6/2pPK1RP/1PP2P2/8 b - - 1 34",
+    "5r1k/6p1/6R1/1p5p/1q1n4/3P3P/5PK1/8 w - - 2 40",
+    "1r5k/6p1/8/1p4Kp/8/1q1P3P/5P2/8 b - - 0 45",
+    "r2qkb1r/pb2n1pp/1p1p1n2/1B1pp1B1/P3P3/1PN5/2P3PP/R2QK1NR b KQkq - 1 12",
+    "r2q2kr/pb4pp/1p1p1b2/1B2p3/P3P3/1Pp2Q2/2P1NKPP/R6R w - - 4 18",
+    "r5kr/6pp/pp1q1b2/3bp3/P1B1p3/1PQ5/R1P3PP/2N3KR b - - 2 23",
+    "r5kr/8/pp3b1p/4p1p1/P1P5/1N2p3/R1P1K1PP/7R w - - 0 29",
+    "6kr/8/7p/NPP1p1b1/4K1p1/8/2P3PP/7R b - - 2 34",
+    "7r/8/7p/1PP1k1b1/8/3K2P1/2P3P1/5R2 w - - 0 40",
+    "7r/2P1R3/7p/1Pk5/2P5/3K2P1/6P1/8 b - - 2 45",
+    "r3kb1r/ppp1pppp/8/2q5/8/5PP1/PP1P2KP/R1B2BNR b kq - 3 12",
+    "r3kb1r/pp2pppp/8/1q6/8/3P1PP1/1P4KP/R1B3NR w kq - 0 18",
+    "3rkb1r/1p2ppp1/8/7p/1P3N2/3P1PP1/q6P/2B3KR b k - 3 23",
+    "3rk2r/1p3pp1/8/7p/1b3P2/3P1P2/3q3P/6KR w k - 0 29",
+    "3r3r/1p3k2/6p1/7p/1b1P4/4qP2/6KP/7R b - - 6 34",
+    "3r2r1/1p3k2/3b2p1/8/3P1PK1/8/7P/5q1R w - - 3 40",
+    "2r5/1p3k2/6p1/2P5/4KP2/3r4/7P/2R5 b - - 8 45",
+    "r1b1k2r/p1p1npp1/2p5/1p3q1P/3Pp1p1/P3P3/PBP1NP2/R2QK2R b KQkq - 2 12",
+    "r4k2/p1p2pp1/2p5/1p3nr1/3Pp1p1/P3P3/RBP2P1K/3Q1R2 w - - 3 18",
+    "1r3k2/p1p2pp1/2p5/1p4R1/3PQ3/P3P3/RBP4K/8 b - - 0 23",
+    "4r1k1/p4pp1/8/8/3P4/PR2P3/RBP4K/8 w - - 2 29",
+    "7k/5Rp1/3P4/p7/6K1/P7/RBP1r3/8 b - - 0 34",
+    "8/3P2k1/8/p7/P7/5K2/3R4/8 w - - 0 40",
+]
+
+# The perft test positions of the Chess Programming Wiki, with a depth and the number of move sequences of that length.
+PERFT_POSITIONS = [
+    (chess.STARTING_FEN, 4, 197281),
+    ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", 3, 97862),
+    ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", 4, 43238),
+    ("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", 3, 9467),
+    ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", 3, 62379),
+    ("r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10", 3, 89890),
+]
+
+
+def bench_boards() -> list[chess.Board]:
+    """Get the benchmark positions."""
+    return [chess.Board(fen) for fen in BENCH_FENS]
+
+
+def evals_per_second(function: Callable[[chess.Board], object], boards: list[chess.Board], seconds: float) -> float:
+    """Call `function` on each board over and over for about `seconds` seconds and return the calls per second."""
+    calls = 0
+    start = time.perf_counter()
+    while (elapsed := time.perf_counter() - start) < seconds:
+        for board in boards:
+            function(board)
+        calls += len(boards)
+    return calls / elapsed
+
+
+def eval_benchmark(seconds: float) -> dict[str, float]:
+    """
+    Measure the speed of the evaluation and of each of its terms.
+
+    :param seconds: How long to run each measurement.
+    :return: The evaluations per second of each term.
+    """
+    boards = bench_boards()
+    terms: dict[str, Callable[[chess.Board], object]] = {
+        "material": eval.get_material_values,
+        "pawn structure": eval.pawn_structure,
+        "king safety": eval.king_safety,
+        "get_evaluation": eval.get_evaluation,
+        "evaluate": eval.evaluate,
+    }
+    return {name: evals_per_second(function, boards, seconds) for name, function in terms.items()}
+
+
+def evaluator_evals_per_second(evaluator: eval.IncrementalEvaluator, seconds: float) -> float:
+    """
+    Play each legal move of the benchmark positions, evaluate, and take it back, for about `seconds` seconds.
+
+    This counts the update of the evaluator on `push` and `pop`, as in a search. The evaluation cache is kept to one
+    entry, so that every evaluation is computed.
+
+    :return: The evaluations per second.
+    """
+    boards = bench_boards()
+    evaluations = 0
+    start = time.perf_counter()
+    while (elapsed := time.perf_counter() - start) < seconds:
+        for board in boards:
+            evaluator.reset(board)
+            for move in list(board.legal_moves):
+                evaluator.push(board, move)
+                evaluator.evaluate(board)
+                evaluator.pop(board)
+                evaluations += 1
+    return evaluations / elapsed
+
+
+def nnue_benchmark(seconds: float, weights: str | None) -> dict[str, float]:
+    """
+    Measure the speed of the network evaluation against the hand-written one.
+
+    :param seconds: How long to run each measurement.
+    :param weights: The path of the network, or None for an untrained one of the default size.
+    :return: The evaluations per second of each evaluator.
+    """
+    network = nnue.Network.load(weights) if weights else nnue.Network.random()
+    evaluators = {"eval.py": eval.IncrementalEvaluator(eval_cache_entries=1),
+                  "nnue.py": nnue.NNUEEvaluator(network, eval_cache_entries=1)}
+    return {name: evaluator_evals_per_second(evaluator, seconds) for name, evaluator in evaluators.items()}
+
+
+def profile_search(depth: int, top: int) -> None:
+    """
+    Search the benchmark positions to a fixed depth under the profiler and print the functions that take the most time.
+
+    :param depth: The depth of each search.
+    :param top: How many functions to print.
+    """
+    searcher = Searcher(TranspositionTable())
+    profiler = cProfile.Profile()
+    for board in bench_boards():
+        profiler.runcall(searcher.search, board, Limit(depth=depth))
+    pstats.Stats(profiler).sort_stats(pstats.SortKey.TIME).print_stats(top)
+
+
+def board_perft(b: chess.Board, depth: int) -> int:
+    """Count the move sequences of length `depth` from `b` with python-chess."""
+    if depth == 0:
+        return 1
+    nodes = 0
+    for move in b.legal_moves:
+        b.push(move)
+        nodes += board_perft(b, depth - 1)
+        b.pop()
+    return nodes
+
+
+def perft_benchmark() -> tuple[int, float]:
+    """
+    Count the moves of the perft positions with python-chess, which the search generates its moves with.
+
+    :return: The number of nodes and the seconds taken.
+    """
+    total = 0
+    start = time.perf_counter()
+    for fen, depth, expected in PERFT_POSITIONS:
+        nodes = board_perft(chess.Board(fen), depth)
+        if nodes != expected:
+            raise RuntimeError(f"Perft of {fen} to depth {depth} gave {nodes} nodes instead of {expected}")
+        total += nodes
+    return total, time.perf_counter() - start
+
+
+def search_benchmark(depth: int, hash_mb: float) -> tuple[int, float, dict[int, tuple[int, float]]]:
+    """
+    Search each of the search positions to a fixed depth, starting from an empty transposition table every time.
+
+    :param depth: The depth of each search.
+    :param hash_mb: The size of the transposition table.
+    :return: The total nodes, the total seconds, and for each depth the number of searches that completed it and the
+        total time they took to get there. Searches stop early when they find a mate or there is only one legal move.
+    """
+    tt = TranspositionTable(hash_mb)
+    time_to_depth = dict.fromkeys(range(1, depth + 1), (0, 0.0))
+    iteration_times: list[float] = []
+    nodes = 0
+    elapsed = 0.0
+    for fen in SEARCH_FENS:
+        tt.clear()
+        searcher = Searcher(tt)
+        searcher.new_search()
+        iteration_times.clear()
+        start = time.perf_counter()
+        searcher.iterative_deepening(chess.Board(fen), None, None, depth,
+                                     on_iteration=lambda _depth, _move, _score: iteration_times.append(time.perf_counter()))
+        elapsed += time.perf_counter() - start
+        nodes += searcher.nodes
+        for completed, end in enumerate(iteration_times, 1):
+            count, seconds = time_to_depth[completed]
+            time_to_depth[completed] = (count + 1, seconds + end - start)
+    return nodes, elapsed, time_to_depth
+
+
+def main() -> None:
+    """Run the benchmark named on the command line."""
+    parser = argparse.ArgumentParser(description="Benchmarks of the homemade engine.")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+    eval_parser = subparsers.add_parser("eval", help="Evaluations per second of each evaluation term.")
+    eval_parser.add_argument("--seconds", type=float, default=1.0, help="Time to spend on each term.")
+    nnue_parser = subparsers.add_parser("nnue", help="Evaluations per second of the network against eval.py.")
+    nnue_parser.add_argument("--seconds", type=float, default=2.0, help="Time to spend on each evaluator.")
+    nnue_parser.add_argument("--weights", help="Path of the network. An untrained one is used if not given.")
+    profile_parser = subparsers.add_parser("profile", help="Profile of fixed-depth searches.")
+    profile_parser.add_argument("--depth", type=int, default=3, help="Depth of each search.")
+    profile_parser.add_argument("--top", type=int, default=15, help="Number of functions to show.")
+    subparsers.add_parser("perft", help="Move generation speed of python-chess.")
+    search_parser = subparsers.add_parser("search", help="Nodes, speed and time to depth of fixed-depth searches.")
+    search_parser.add_argument("--depth", type=int, default=4, help="Depth of each search.")
+    search_parser.add_argument("--hash", type=float, default=64, help="Size of the transposition table in MB.")
+    args = parser.parse_args()
+
+    if args.benchmark == "eval":
+        for name, speed in eval_benchmark(args.seconds).items():
+            print(f"{name:>16}: {speed:10.0f} evals/s")  # noqa: T201
+    elif args.benchmark == "nnue":
+        for name, speed in nnue_benchmark(args.seconds, args.weights).items():
+            print(f"{name:>16}: {speed:10.0f} evals/s")  # noqa: T201
+    elif args.benchmark == "profile":
+        profile_search(args.depth, args.top)
+    elif args.benchmark == "perft":
+        nodes, seconds = perft_benchmark()
+        print(f"{nodes} nodes in {seconds:.2f} s, {nodes / seconds:10.0f} nodes/s")  # noqa: T201
+    elif args.benchmark == "search":
+        nodes, seconds, time_to_depth = search_benchmark(args.depth, args.hash)
+        for depth, (count, depth_seconds) in time_to_depth.items():
+            print(f"Depth {depth:>2}: {count} searches, {depth_seconds:.2f} s")  # noqa: T201
+        print(f"Nodes: {nodes}")  # noqa: T201
+        print(f"Time: {seconds:.2f} s")  # noqa: T201
+        print(f"Nodes/second: {nodes / seconds:.0f}")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
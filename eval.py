@@ -1,222 +1,480 @@
+from collections.abc import Sequence
+import numpy as np
+import numpy.typing as npt
 import positions
 import chess
-
-
-def get_material_values(b: chess.Board) -> int:
-    
-    total_material = 0
-    
-    values = {
-        chess.PAWN: 100,
-        chess.KNIGHT: 320,
-        chess.BISHOP: 330,
-        chess.ROOK: 500,
-        chess.QUEEN: 900,
-        chess.KING: 2000,  # king material ignored (checkmates handled above)
-    }
-
-    #get number of pieces in the board of each type for white
-    nwp = len(b.pieces(chess.PAWN, chess.WHITE))
-    nwr = len(b.pieces(chess.ROOK, chess.WHITE))
-    nwk = len(b.pieces(chess.KNIGHT, chess.WHITE))
-    nwb = len(b.pieces(chess.BISHOP, chess.WHITE))
-    nwq = len(b.pieces(chess.QUEEN, chess.WHITE))
-    nwking = len(b.pieces(chess.KING, chess.WHITE))
-
-    #get number of pieces in the board of each type for black
-    nbp = len(b.pieces(chess.PAWN, chess.BLACK))
-    nbr = len(b.pieces(chess.ROOK, chess.BLACK))
-    nbk = len(b.pieces(chess.KNIGHT, chess.BLACK))
-    nbb = len(b.pieces(chess.BISHOP, chess.BLACK))
-    nbq = len(b.pieces(chess.QUEEN, chess.BLACK))
-    nbking = len(b.pieces(chess.KING, chess.BLACK))
-
-
-    #get the final value for each piece
-    #whites
-    wpw = nwp * values[chess.PAWN] #pawn
-    wrw = nwr * values[chess.ROOK] #rook
-    wkw = nwk * values[chess.KNIGHT] #knight
-    wbw = nwb * values[chess.BISHOP] #bishop
-    wqw = nwq * values[chess.QUEEN] #queen
-    wkingw = nwking * values[chess.KING] #King
-
-    #blacks
-    bpw = nbp * values[chess.PAWN] #pawn
-    brw = nbr * values[chess.ROOK] #rook
-    bkw = nbk * values[chess.KNIGHT] #knight
-    bbw = nbb * values[chess.BISHOP] #bishop
-    bqw = nbq * values[chess.QUEEN] #queen
-    bkingw = nbking * values[chess.KING] #King
-
-
-    # add all the values
-    white_material = wpw + wrw + wkw + wbw + wqw + wkingw 
-    black_material = bpw + brw + bkw + bbw + bqw + bkingw
-    total_material = white_material - black_material
-    
-    #print(total_material, black_material, white_material)
-
-    return total_material, white_material, black_material
-
-#Just to check if there is some sort of structure(not the structure itself)
-def pawn_structure(b: chess.Board):
+import chess.polyglot
+
+MATE_SCORE = 10_000_000
+# Mates are scored MATE_SCORE minus the number of plies to the mate, so scores past this threshold are mates.
+MATE_THRESHOLD = MATE_SCORE - 1000
+
+PIECE_VALUES = {
+    chess.PAWN: 100,
+    chess.KNIGHT: 320,
+    chess.BISHOP: 330,
+    chess.ROOK: 500,
+    chess.QUEEN: 900,
+    chess.KING: 2000,  # Both sides always have a king, so its value cancels out (mates are found by the search).
+}
+
+
+# Material plus piece-square value of a piece, signed from white's point of view: PSQT[color][piece_type][square]
+PSQT = positions.signed_tables(positions.MIDGAME_TABLES, PIECE_VALUES)
+PSQT_ENDGAME = positions.signed_tables(positions.ENDGAME_TABLES, PIECE_VALUES)
+
+# The game phase goes from MAX_PHASE with all the pieces on the board (midgame) down to 0 with only kings and pawns
+# (endgame). Extra pieces from promotions can take it above MAX_PHASE, so it is capped when used.
+PHASE_WEIGHTS = [0, 0, 1, 1, 2, 4, 0]  # Indexed by piece type.
+MAX_PHASE = 24
+
+
+# Polyglot Zobrist keys of a piece on a square: ZOBRIST_PIECES[color][piece_type][square]
+ZOBRIST_PIECES = [[[0] * 64 for _ in range(7)] for _ in range(2)]
+for _color in chess.COLORS:
+    for _piece_type in chess.PIECE_TYPES:
+        for _square in chess.SQUARES:
+            ZOBRIST_PIECES[_color][_piece_type][_square] = chess.polyglot.POLYGLOT_RANDOM_ARRAY[
+                64 * ((_piece_type - 1) * 2 + _color) + _square]
+ZOBRIST_TURN = chess.polyglot.POLYGLOT_RANDOM_ARRAY[780]
+ZOBRIST_HASHER = chess.polyglot.ZobristHasher(chess.polyglot.POLYGLOT_RANDOM_ARRAY)
+
+
+def psqt_scores(b: chess.Board) -> tuple[int, int]:
+    """Material and piece-square value of every piece in the midgame and in the endgame, from white's point of view."""
+    midgame = endgame = 0
+    for color in chess.COLORS:
+        occupied = b.occupied_co[color]
+        for piece_type, bb in ((chess.PAWN, b.pawns), (chess.KNIGHT, b.knights), (chess.BISHOP, b.bishops),
+                               (chess.ROOK, b.rooks), (chess.QUEEN, b.queens), (chess.KING, b.kings)):
+            midgame_table, endgame_table = PSQT[color][piece_type], PSQT_ENDGAME[color][piece_type]
+            for square in chess.scan_forward(bb & occupied):
+                midgame += midgame_table[square]
+                endgame += endgame_table[square]
+    return midgame, endgame
+
+
+def game_phase(b: chess.Board) -> int:
+    """Get the game phase from the pieces left on the board (see `MAX_PHASE`)."""
+    return (chess.popcount(b.knights | b.bishops) + PHASE_WEIGHTS[chess.ROOK] * chess.popcount(b.rooks)
+            + PHASE_WEIGHTS[chess.QUEEN] * chess.popcount(b.queens))
+
+
+def taper(midgame: int, endgame: int, phase: int) -> int:
+    """Blend a midgame and an endgame score by the game phase."""
+    phase = min(phase, MAX_PHASE)
+    return (midgame * phase + endgame * (MAX_PHASE - phase)) // MAX_PHASE
+
+
+def psqt_score(b: chess.Board) -> int:
+    """Material and piece-square value of every piece on the board, from white's point of view."""
+    return taper(*psqt_scores(b), game_phase(b))
+
+
+def move_delta(b: chess.Board, m: chess.Move) -> tuple[int, int, int, int]:
+    """
+    Get the changes of the pieces when `m` is played. `b` is the position before the move.
+
+    :return: The changes of the midgame and endgame piece-square values (see `psqt_scores`) and of the game phase, and
+        the Zobrist keys of the pieces to XOR into the key of the position (the keys of the castling rights, en passant
+        file and side to move are left out).
+    """
+    if not m:
+        return 0, 0, 0, 0  # null move
+    us = b.turn
+    from_square, to_square = m.from_square, m.to_square
+    piece_type = b.piece_type_at(from_square)
+    assert piece_type is not None
+    midgame, endgame, keys = PSQT[us], PSQT_ENDGAME[us], ZOBRIST_PIECES[us]
+    if piece_type == chess.KING and b.is_castling(m):
+        rank = chess.square_rank(from_square)
+        kingside = chess.square_file(to_square) > chess.square_file(from_square)
+        # Standard chess gives the king's destination, chess960 gives the square of the rook the king "captures".
+        rook_from = to_square if b.occupied_co[us] & chess.BB_SQUARES[to_square] else chess.square(7 if kingside else 0, rank)
+        king_to = chess.square(6 if kingside else 2, rank)
+        rook_to = chess.square(5 if kingside else 3, rank)
+        return (midgame[chess.KING][king_to] - midgame[chess.KING][from_square]
+                + midgame[chess.ROOK][rook_to] - midgame[chess.ROOK][rook_from],
+                endgame[chess.KING][king_to] - endgame[chess.KING][from_square]
+                + endgame[chess.ROOK][rook_to] - endgame[chess.ROOK][rook_from],
+                0,
+                keys[chess.KING][king_to] ^ keys[chess.KING][from_square]
+                ^ keys[chess.ROOK][rook_to] ^ keys[chess.ROOK][rook_from])
+
+    new_piece_type = m.promotion or piece_type
+    midgame_delta = midgame[new_piece_type][to_square] - midgame[piece_type][from_square]
+    endgame_delta = endgame[new_piece_type][to_square] - endgame[piece_type][from_square]
+    phase_delta = PHASE_WEIGHTS[new_piece_type] - PHASE_WEIGHTS[piece_type]
+    key = keys[new_piece_type][to_square] ^ keys[piece_type][from_square]
+    if b.is_en_passant(m):
+        captured_square = to_square - 8 if us == chess.WHITE else to_square + 8
+        midgame_delta -= PSQT[not us][chess.PAWN][captured_square]
+        endgame_delta -= PSQT_ENDGAME[not us][chess.PAWN][captured_square]
+        key ^= ZOBRIST_PIECES[not us][chess.PAWN][captured_square]
+    else:
+        captured = b.piece_type_at(to_square)
+        if captured:
+            midgame_delta -= PSQT[not us][captured][to_square]
+            endgame_delta -= PSQT_ENDGAME[not us][captured][to_square]
+            phase_delta -= PHASE_WEIGHTS[captured]
+            key ^= ZOBRIST_PIECES[not us][captured][to_square]
+    return midgame_delta, endgame_delta, phase_delta, key
+
+
+def move_keys(b: chess.Board, m: chess.Move) -> int:
+    """Get only the Zobrist keys of the pieces of `move_delta`, for evaluators that don't use piece-square values."""
+    if not m:
+        return 0  # null move
+    us = b.turn
+    from_square, to_square = m.from_square, m.to_square
+    piece_type = b.piece_type_at(from_square)
+    assert piece_type is not None
+    keys = ZOBRIST_PIECES[us]
+    if piece_type == chess.KING and b.is_castling(m):
+        rank = chess.square_rank(from_square)
+        kingside = chess.square_file(to_square) > chess.square_file(from_square)
+        rook_from = to_square if b.occupied_co[us] & chess.BB_SQUARES[to_square] else chess.square(7 if kingside else 0, rank)
+        return (keys[chess.KING][chess.square(6 if kingside else 2, rank)] ^ keys[chess.KING][from_square]
+                ^ keys[chess.ROOK][chess.square(5 if kingside else 3, rank)] ^ keys[chess.ROOK][rook_from])
+    key = keys[m.promotion or piece_type][to_square] ^ keys[piece_type][from_square]
+    if b.is_en_passant(m):
+        key ^= ZOBRIST_PIECES[not us][chess.PAWN][to_square - 8 if us == chess.WHITE else to_square + 8]
+    else:
+        captured = b.piece_type_at(to_square)
+        if captured:
+            key ^= ZOBRIST_PIECES[not us][captured][to_square]
+    return key
+
+
+# Pawn shield in front of a king on each square: the three squares on the next rank towards the enemy.
+KING_SHIELD = [[0] * 64 for _ in range(2)]
+for _square in chess.SQUARES:
+    for _color, _direction in ((chess.WHITE, 1), (chess.BLACK, -1)):
+        _rank = chess.square_rank(_square) + _direction
+        if 0 <= _rank < 8:
+            _file = chess.square_file(_square)
+            for _f in range(max(0, _file - 1), min(8, _file + 2)):
+                KING_SHIELD[_color][_square] |= chess.BB_SQUARES[chess.square(_f, _rank)]
+
+DOUBLED_PAWN_PENALTY = 10  # Once per file with more than one pawn of the same color.
+SHIELD_PAWN_BONUS = 10
+
+
+def get_material_values(b: chess.Board) -> tuple[int, int, int]:
+    """Get the material balance, and the material of white and of black."""
+    white = b.occupied_co[chess.WHITE]
+    black = b.occupied_co[chess.BLACK]
+    white_material = 0
+    black_material = 0
+    for piece_type, bb in ((chess.PAWN, b.pawns), (chess.KNIGHT, b.knights), (chess.BISHOP, b.bishops),
+                           (chess.ROOK, b.rooks), (chess.QUEEN, b.queens), (chess.KING, b.kings)):
+        white_material += PIECE_VALUES[piece_type] * chess.popcount(bb & white)
+        black_material += PIECE_VALUES[piece_type] * chess.popcount(bb & black)
+    return white_material - black_material, white_material, black_material
+
+
+def pawn_structure(b: chess.Board) -> int:
+    """Penalize doubled pawns, from white's point of view."""
+    # The first version also meant to penalize isolated pawns, but its test could never be true, so the term only
+    # ever counted doubled pawns. That is kept as is: changing the evaluation is a matter for tuning.
     val = 0
-
-
-    #Iterate for both color
-    for color in [chess.WHITE, chess.BLACK]:
-        multiplier = 1
-
-        if not color:
-            multiplier = -1
-
-        
-        #get position of pawns
-        pawns = b.pieces(chess.PAWN, color)
-
-        #check each line for isolated pawns
-        for col in range(8):
-
-
-            pawns_col = sum(1 for p in pawns if chess.square_file(p) == col)#file is column and row is rank
-            if (pawns_col > 0):
-                #there are pawns in the column check adjacent columns
-
-                adj_pawns = sum(1 for p in pawns if chess.square_file(p) in [col-1, col+1])
-
-                #if we dont have adjacent pawns means that we dont have structure
-                if adj_pawns < 0:
-                    val -= 20 * multiplier# isolated pawn penalty
-            
-            if (pawns_col > 1):
-                val -= 10 * multiplier# penalty for when we have two pawn in the same column
-    
+    white_pawns = b.pawns & b.occupied_co[chess.WHITE]
+    black_pawns = b.pawns & b.occupied_co[chess.BLACK]
+    for file_mask in chess.BB_FILES:
+        if chess.popcount(white_pawns & file_mask) > 1:
+            val -= DOUBLED_PAWN_PENALTY
+        if chess.popcount(black_pawns & file_mask) > 1:
+            val += DOUBLED_PAWN_PENALTY
     return val
 
-def king_safety(b: chess.Board)-> int:
-    val = 0
-
-    #evaluate both colors
-    for color in [chess.WHITE, chess.BLACK]:
-        multiplier = 1
-        if not color:
-            multiplier = -1
-
-        #get the square of the king
-        king_sq = b.king(color)
-        
 
-        #get the king file
-        k_file = chess.square_file(king_sq)
-        #get the king rank
-        k_rank = chess.square_rank(king_sq)
-
-
-        #check pawn shield
-        shield_score = 0
-        for f in range(max(0, k_file -1), min(8, k_file + 2)):
-            shield_rank = k_rank + multiplier
-            shield_sq = chess.square(f, shield_rank)
-
-            if(b.piece_at(shield_sq) == chess.Piece(chess.PAWN, color)):
-                shield_score += 10
-        
-        val += shield_score * multiplier
-        
-
-        
+def king_safety(b: chess.Board) -> int:
+    """Reward pawns in front of the kings, from white's point of view."""
+    val = 0
+    for color, multiplier in ((chess.WHITE, 1), (chess.BLACK, -1)):
+        king_mask = b.kings & b.occupied_co[color]
+        if king_mask:
+            shield = KING_SHIELD[color][chess.lsb(king_mask)]
+            val += multiplier * SHIELD_PAWN_BONUS * chess.popcount(shield & b.pawns & b.occupied_co[color])
     return val
 
 
-def get_evaluation(b: chess.Board) -> int:
-    #check for terminal outcome
-    if b.is_game_over():
-        outcome = b.outcome()
-        if outcome is None or outcome.winner is None:
-            return 0  # draw
-        return 10_000_000 if outcome.winner is chess.WHITE else -10_000_000
-    
-    
-    #get material
-    total_material, white_value, black_value = get_material_values(b)
-
-    #get the values for each piece(value of white - value of black)
-    #pawns
-    pawn_value = sum([positions.pawnTable[index] for index in b.pieces(chess.PAWN, chess.WHITE)])
-    pawn_value = pawn_value + sum([-positions.pawnTable[chess.square_mirror(index)] for index in b.pieces(chess.PAWN, chess.BLACK)])
-
-    #rooks
-    rook_value = sum([positions.rookTable[index] for index in b.pieces(chess.ROOK, chess.WHITE)])
-    rook_value = rook_value + sum([-positions.rookTable[chess.square_mirror(index)] for index in b.pieces(chess.ROOK, chess.BLACK)])
-
-    #knights
-    knight_value = sum([positions.knightTable[index] for index in b.pieces(chess.KNIGHT, chess.WHITE)])
-    knight_value = knight_value + sum([-positions.knightTable[chess.square_mirror(index)] for index in b.pieces(chess.KNIGHT, chess.BLACK)])
-
-    #bishops
-    bishop_value = sum([positions.bishopTable[index] for index in b.pieces(chess.BISHOP, chess.WHITE)])
-    bishop_value = bishop_value + sum([-positions.bishopTable[chess.square_mirror(index)] for index in b.pieces(chess.BISHOP, chess.BLACK)])
-
+# Layout of the positions evaluated by `evaluate_batch`: one plane of 64 squares per color and piece type, at
+# color * 6 + piece_type - 1 (colors are indexed like python-chess colors, BLACK = 0, WHITE = 1).
+PLANES = 12
+# BATCH_PSQT[plane * 64 + square]: the midgame and endgame value of a piece on a square.
+BATCH_PSQT = np.array([[PSQT[color][piece_type][square], PSQT_ENDGAME[color][piece_type][square]]
+                       for color in (chess.BLACK, chess.WHITE) for piece_type in chess.PIECE_TYPES
+                       for square in chess.SQUARES], dtype=np.int64)
+BATCH_PHASE = np.array([PHASE_WEIGHTS[piece_type] for _ in chess.COLORS for piece_type in chess.PIECE_TYPES],
+                       dtype=np.int64)
+# BATCH_SHIELD[color][king square][square]: whether a pawn on square shields the king.
+BATCH_SHIELD = np.array([[[bool(KING_SHIELD[color][king] & chess.BB_SQUARES[square]) for square in chess.SQUARES]
+                          for king in chess.SQUARES] for color in (chess.BLACK, chess.WHITE)], dtype=np.int64)
 
-    #bishop pair extra value(two bishops is good combination)
-    if (len(b.pieces(chess.BISHOP, chess.WHITE))):
-        bishop_value += 50
-    if (len(b.pieces(chess.BISHOP, chess.WHITE))):
-        bishop_value -= 50
 
-    #queen
-    queen_value = sum([positions.queenTable[index] for index in b.pieces(chess.QUEEN, chess.WHITE)])
-    queen_value = queen_value + sum([-positions.queenTable[chess.square_mirror(index)] for index in b.pieces(chess.QUEEN, chess.BLACK)])
+def plane(color: chess.Color, piece_type: chess.PieceType) -> int:
+    """Get the index of the plane of a piece (see `PLANES`)."""
+    return color * 6 + piece_type - 1
 
-    #king
-    king_value = sum([positions.kingTable[index] for index in b.pieces(chess.KING, chess.WHITE)])
-    king_value = king_value + sum([-positions.kingTable[chess.square_mirror(index)] for index in b.pieces(chess.KING, chess.BLACK)])
 
+def board_bitboards(b: chess.Board) -> list[int]:
+    """Get the bitboard of each plane of a board (see `PLANES`)."""
+    return [bb & b.occupied_co[color] for color in (chess.BLACK, chess.WHITE)
+            for bb in (b.pawns, b.knights, b.bishops, b.rooks, b.queens, b.kings)]
 
 
-    #evaluate pawn structure
-    p_s_score = pawn_structure(b)
+def evaluate_batch(boards: Sequence[chess.Board]) -> npt.NDArray[np.int64]:
+    """Evaluate many positions at once, from white's point of view. Gives the same scores as `evaluate`."""
+    return evaluate_bitboards([board_bitboards(b) for b in boards])
 
-    #evaluate king safety
-    k_s_score = king_safety(b)
 
-    #print(total_material, pawn_value, rook_value, knight_value,  bishop_value , queen_value , king_value)
-    eval_value = total_material + pawn_value + rook_value + knight_value + bishop_value + queen_value + king_value + p_s_score + k_s_score
+def evaluate_bitboards(bitboards: Sequence[Sequence[int]]) -> npt.NDArray[np.int64]:
+    """
+    Evaluate positions given by the bitboards of their planes (see `board_bitboards`), from white's point of view.
 
-    return eval_value
-    
+    The piece-square values of all the positions are one matrix product, and the other terms are computed on the
+    whole stack of positions too, so the cost per position is mostly getting its bitboards.
+    """
+    count = len(bitboards)
+    packed = np.array(bitboards, dtype="<u8").reshape(count, PLANES)
+    planes = np.unpackbits(packed.view(np.uint8), axis=1, bitorder="little").reshape(count, PLANES, 64)
+    midgame, endgame = (planes.reshape(count, PLANES * 64).astype(np.int64) @ BATCH_PSQT).T
+    phase = np.minimum(planes.sum(axis=2, dtype=np.int64) @ BATCH_PHASE, MAX_PHASE)
+    scores: npt.NDArray[np.int64] = (midgame * phase + endgame * (MAX_PHASE - phase)) // MAX_PHASE
 
-def num_pieces(b: chess.Board):
-    num_whites = len(b.pieces(chess.PAWN, chess.WHITE))
-    num_whites += len(b.pieces(chess.ROOK, chess.WHITE))
-    num_whites += len(b.pieces(chess.BISHOP, chess.WHITE))
-    num_whites += len(b.pieces(chess.KNIGHT, chess.WHITE))
-    num_whites += len(b.pieces(chess.QUEEN, chess.WHITE))
-    num_whites += len(b.pieces(chess.KING, chess.WHITE))
+    pawns_per_file = planes.reshape(count, PLANES, 8, 8).sum(axis=2)
+    for color, sign in ((chess.WHITE, 1), (chess.BLACK, -1)):
+        pawns = planes[:, plane(color, chess.PAWN)]
+        doubled_files = (pawns_per_file[:, plane(color, chess.PAWN)] > 1).sum(axis=1)
+        kings = planes[:, plane(color, chess.KING)]
+        shield = BATCH_SHIELD[int(color)][kings.argmax(axis=1)]
+        shield_pawns = (shield * pawns).sum(axis=1) * kings.any(axis=1)
+        scores += sign * (SHIELD_PAWN_BONUS * shield_pawns - DOUBLED_PAWN_PENALTY * doubled_files)
+    return scores
 
-    num_black = len(b.pieces(chess.PAWN, chess.BLACK))
-    num_black += len(b.pieces(chess.ROOK, chess.BLACK))
-    num_black += len(b.pieces(chess.BISHOP, chess.BLACK))
-    num_black += len(b.pieces(chess.KNIGHT, chess.BLACK))
-    num_black += len(b.pieces(chess.QUEEN, chess.BLACK))
-    num_black += len(b.pieces(chess.KING, chess.BLACK))
 
-
-    return num_whites + num_black
+def get_evaluation(b: chess.Board) -> int:
+    """Evaluate the position from white's point of view, without looking for mates and draws (see `evaluate`)."""
+    # Material and piece-square values. The first version also gave a bishop pair bonus, but added it and took it
+    # away again for white, so it never changed the score and is left out.
+    score: int = psqt_score(b) + pawn_structure(b) + king_safety(b)
+    return score
+
+
+def num_pieces(b: chess.Board) -> int:
+    """Count the pieces of both colors, kings and pawns included."""
+    return chess.popcount(b.occupied)
+
+
+DEFAULT_PAWN_HASH_ENTRIES = 16384
+
+
+class PawnHashTable:
+    """
+    A direct-mapped cache of the pawn structure score, keyed by the pawns of both colors.
+
+    Pawns move rarely, so most positions of a search share their pawn structure with many others.
+    """
+
+    def __init__(self, entries: int = DEFAULT_PAWN_HASH_ENTRIES) -> None:
+        """:param entries: The number of pawn structures kept."""
+        self.size = max(1, entries)
+        self.white_pawns = [-1] * self.size  # No real pawn bitboard is negative, so -1 marks an empty slot.
+        self.black_pawns = [0] * self.size
+        self.scores = [0] * self.size
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        """Reset the probe and hit counters."""
+        self.probes = 0
+        self.hits = 0
+
+    def pawn_structure(self, b: chess.Board) -> int:
+        """Get `pawn_structure(b)`, from the table if this pawn structure was seen before."""
+        white_pawns = b.pawns & b.occupied_co[chess.WHITE]
+        black_pawns = b.pawns & b.occupied_co[chess.BLACK]
+        index = hash((white_pawns, black_pawns)) % self.size
+        self.probes += 1
+        if self.white_pawns[index] == white_pawns and self.black_pawns[index] == black_pawns:
+            self.hits += 1
+            return self.scores[index]
+        score = pawn_structure(b)
+        self.white_pawns[index] = white_pawns
+        self.black_pawns[index] = black_pawns
+        self.scores[index] = score
+        return score
+
+    def stats(self) -> str:
+        """Get a human-readable summary of the counters."""
+        hit_rate = self.hits / self.probes * 100 if self.probes else 0.0
+        return f"Pawn hash: {self.hits}/{self.probes} hits ({hit_rate:.1f}%)"
+
+
+DEFAULT_EVAL_CACHE_ENTRIES = 65536
+
+
+class EvalCache:
+    """
+    A direct-mapped cache of static evaluations keyed by the Zobrist key of the position.
+
+    The search evaluates the same leaves more than once: re-searches after a null window or a reduction fails, razoring
+    and the quiescence search below it, and transpositions the transposition table doesn't catch in the quiescence
+    search. A newer position simply replaces the one in its slot.
+    """
+
+    def __init__(self, entries: int = DEFAULT_EVAL_CACHE_ENTRIES) -> None:
+        """:param entries: The number of evaluations kept."""
+        self.size = max(1, entries)
+        self.keys = [-1] * self.size  # Zobrist keys are never negative, so -1 marks an empty slot.
+        self.scores = [0] * self.size
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        """Reset the hit and miss counters."""
+        self.hits = 0
+        self.misses = 0
+
+    def probe(self, key: int) -> int | None:
+        """Get the cached evaluation of the position with Zobrist key `key`, or None if it isn't cached."""
+        index = key % self.size
+        if self.keys[index] == key:
+            self.hits += 1
+            return self.scores[index]
+        self.misses += 1
+        return None
+
+    def store(self, key: int, score: int) -> None:
+        """Cache the evaluation of the position with Zobrist key `key`."""
+        index = key % self.size
+        self.keys[index] = key
+        self.scores[index] = score
+
+    def stats(self) -> str:
+        """Get a human-readable summary of the counters."""
+        probes = self.hits + self.misses
+        hit_rate = self.hits / probes * 100 if probes else 0.0
+        return f"Eval cache: {self.hits} hits, {self.misses} misses ({hit_rate:.1f}% hits)"
+
+
+class IncrementalEvaluator:
+    """
+    Keep the piece-square values, the game phase and the Zobrist key up to date as moves are made and unmade.
+
+    The midgame and endgame values are summed separately and only blended once per evaluation.
+
+    The keys of the positions played are kept too, so that the search can find repetitions without
+    `b.is_repetition`, which replays the move stack.
+
+    Moves have to be played with `push` and `pop` instead of `b.push` and `b.pop`. With `debug`, every evaluation is
+    checked against `evaluate` and every key against `chess.polyglot.zobrist_hash`.
+    """
+
+    def __init__(self, debug: bool = False, pawn_hash_entries: int = DEFAULT_PAWN_HASH_ENTRIES,
+                 eval_cache_entries: int = DEFAULT_EVAL_CACHE_ENTRIES) -> None:
+        """
+        Create an evaluator that is not following any position yet.
+
+        :param debug: Whether to check every evaluation against a full one.
+        :param pawn_hash_entries: The size of the pawn hash table.
+        :param eval_cache_entries: The size of the evaluation cache.
+        """
+        self.debug = debug
+        self.midgame = 0
+        self.endgame = 0
+        self.phase = 0
+        self.key = 0
+        self.castling_key = 0
+        self.stack: list[tuple[int, int, int, int, int]] = []
+        self.history: list[int] = []  # The keys of the positions since the last capture or pawn move, oldest first.
+        self.pawn_table = PawnHashTable(pawn_hash_entries)
+        self.cache = EvalCache(eval_cache_entries)
+
+    def reset(self, b: chess.Board) -> None:
+        """Start following the position `b`."""
+        self.midgame, self.endgame = psqt_scores(b)
+        self.phase = game_phase(b)
+        self.key = chess.polyglot.zobrist_hash(b)
+        self.castling_key = ZOBRIST_HASHER.hash_castling(b)
+        self.stack.clear()
+        past = b.copy(stack=min(b.halfmove_clock, len(b.move_stack)))
+        self.history = [self.key]
+        while past.move_stack:
+            past.pop()
+            self.history.append(chess.polyglot.zobrist_hash(past))
+        self.history.reverse()
+
+    def push(self, b: chess.Board, m: chess.Move) -> None:
+        """Play a move on `b` and update the accumulator and the key."""
+        midgame_change, endgame_change, phase_change, key_change = move_delta(b, m)
+        self.push_key(b, m, key_change)
+        self.midgame += midgame_change
+        self.endgame += endgame_change
+        self.phase += phase_change
+
+    def push_key(self, b: chess.Board, m: chess.Move, piece_keys: int) -> None:
+        """
+        Play a move on `b` and update only the key and the repetition history, leaving the accumulator as it is.
+
+        `pop` takes it back like a move played with `push`.
+
+        :param piece_keys: The Zobrist keys of the pieces the move changes (see `move_delta` and `move_keys`).
+        """
+        self.stack.append((self.midgame, self.endgame, self.phase, self.key, self.castling_key))
+        key = self.key ^ piece_keys ^ ZOBRIST_TURN
+        if b.ep_square is not None:
+            key ^= ZOBRIST_HASHER.hash_ep_square(b)
+        castling_rights = b.castling_rights
+        b.push(m)
+        if b.ep_square is not None:
+            key ^= ZOBRIST_HASHER.hash_ep_square(b)
+        if b.castling_rights != castling_rights:
+            castling_key = ZOBRIST_HASHER.hash_castling(b)
+            key ^= self.castling_key ^ castling_key
+            self.castling_key = castling_key
+        self.key = key
+        self.history.append(key)
+        if self.debug and key != chess.polyglot.zobrist_hash(b):
+            raise AssertionError(f"Incremental key {key:x} is wrong after {b.move_stack[-8:]} in {b.fen()}")
+
+    def pop(self, b: chess.Board) -> chess.Move:
+        """Take back the last move played on `b` with `push`."""
+        self.midgame, self.endgame, self.phase, self.key, self.castling_key = self.stack.pop()
+        self.history.pop()
+        return b.pop()
+
+    def psqt(self) -> int:
+        """Get `psqt_score` of the current position from the accumulators."""
+        return taper(self.midgame, self.endgame, self.phase)
+
+    def is_repetition(self, b: chess.Board) -> bool:
+        """Whether the position `b` was already reached since the last capture or pawn move."""
+        history = self.history
+        current = len(history) - 1
+        for index in range(current - 4, max(-1, current - 1 - b.halfmove_clock), -2):
+            if history[index] == history[current]:
+                return True
+        return False
+
+    def evaluate(self, b: chess.Board) -> int:
+        """Evaluate like `evaluate`, with the material and piece-square values taken from the accumulator."""
+        cached = self.cache.probe(self.key)
+        if cached is not None and not self.debug:
+            return cached
+        score: int = self.psqt() + self.pawn_table.pawn_structure(b) + king_safety(b)
+        self.cache.store(self.key, score)
+        if self.debug:
+            expected = evaluate(b)
+            if score != expected:
+                raise AssertionError(f"Incremental evaluation {score} != {expected} after {b.move_stack[-8:]} in {b.fen()}")
+        return score
 
 
 def evaluate(b: chess.Board) -> int:
-            # Large score for terminal outcomes
-            if b.is_game_over():
-                outcome = b.outcome()
-                if outcome is None or outcome.winner is None:
-                    return 0  # draw
-                return 10_000_000 if outcome.winner is chess.WHITE else -10_000_000
-
-            #atacker have more value
-            #check
-            #not check mate
-            #castling
-            score = get_evaluation(b)
-            return score
\ No newline at end of file
+    """
+    Get the static evaluation of a position from white's point of view.
+
+    Mates and draws are not recognized here. The search finds them from its own move generation and key history, which
+    is much cheaper than calling `b.is_game_over()` at every leaf.
+    """
+    return get_evaluation(b)
@@ -5,14 +5,18 @@ With these classes, bot makers will not have to implement the UCI or XBoard inte
 """
 import chess
 from chess.engine import PlayResult, Limit
-import random
 from lib.engine_wrapper import MinimalEngine
-from lib.lichess_types import MOVE, HOMEMADE_ARGS_TYPE
+from lib.config import Configuration
+from lib import model
+from lib.lichess_types import MOVE, HOMEMADE_ARGS_TYPE, OPTIONS_GO_EGTB_TYPE, COMMANDS_TYPE
 import logging
 from collections import deque
+from types import TracebackType
 import positions
-import eval
-import time
+from transposition import TranspositionTable, DEFAULT_HASH_MB
+from search import Searcher, allocate_time
+from selectivity import is_enabled
+from parallel import LazySMP, RootSplit, worker_count
 
 
 # Use this logger variable to print messages to the console or log files.
@@ -20,143 +24,102 @@ import time
 # logger.debug("message") will only print "message" if verbose logging is enabled.
 logger = logging.getLogger(__name__)
 
+# Given to the instance of MyBot that ponders in the background: the name of the shared memory of the main instance's
+# transposition table, which it searches in instead of allocating its own.
+PONDER_HASH_OPTION = "PonderSharedHash"
+
 
 class ExampleEngine(MinimalEngine):
     """An example engine that all homemade engines inherit."""
 
 class MyBot(ExampleEngine):
-    """Template code for hackathon participants to modify.
-
-    This is intentionally a very small, simple, and weak example engine
-    meant for learning and quick prototyping only.
-
-    Key limitations:
-    - Fixed-depth search with only a very naive time-to-depth mapping (no true time management).
-    - x No iterative deepening: the engine does not progressively deepen and use PV-based ordering.
-    - x half No move ordering or capture heuristics: moves are searched in arbitrary order.
-    - No transposition table or caching: repeated positions are re-searched.
-    - Evaluation is material-only and very simplistic; positional factors are ignored.
-
-    Use this as a starting point: add iterative deepening, quiescence search, move ordering (MVV/LVA, history),
-    transposition table, and a richer evaluator to make it competitive.
+    """A principal variation search engine, set up by the engine's `homemade_options` (see `config.yml.default`).
+
+    - Search: principal variation search with iterative deepening and aspiration windows, a soft and a hard time
+      limit taken from the game clock, and a quiescence search of captures and promotions at the horizon.
+    - Transposition table sized by `Hash` (in MB). It, the history, the killers and the principal variation are kept
+      between moves and aged.
+    - Move ordering: TT move, MVV-LVA captures, killer moves and history.
+    - Selectivity: null-move pruning, late move reductions, futility and reverse futility pruning, razoring and check
+      extensions, each of which can be turned off (see `selectivity.py`).
+    - Evaluation: tapered material and piece-square values updated incrementally as moves are made, pawn structure
+      from a pawn hash table and king safety, with an evaluation cache. `EvalDebug: true` checks every incremental
+      evaluation against a full one. `NNUEWeights` evaluates with an NNUE-style network instead (see `nnue.py`).
+    - Parallel search with `Threads` processes: Lazy SMP, where they all search the same position and share the
+      transposition table, or root split (`RootSplit: true`), where the root moves are shared out between them.
+    - Pondering (`ponder: true`) in a background process that shares the transposition table, dropped as soon as the
+      opponent plays another move.
     """
 
-    
+    def __init__(self, commands: COMMANDS_TYPE, options: OPTIONS_GO_EGTB_TYPE, stderr: int | None,
+                 draw_or_resign: Configuration, game: model.Game | None = None, **popen_args: str) -> None:
+        """Allocate the transposition table once for the whole game and read the search options."""
+        super().__init__(commands, options, stderr, draw_or_resign, game, **popen_args)
+        hash_option = options.get("Hash", DEFAULT_HASH_MB)
+        hash_mb = float(hash_option) if isinstance(hash_option, (int, float, str)) else DEFAULT_HASH_MB
+        workers = worker_count(options.get("Threads", 1), options.get("concurrency", 1))
+        self.smp: LazySMP | RootSplit | None = None
+        if workers > 1 and is_enabled(options.get("RootSplit", False)):
+            self.smp = RootSplit(workers, hash_mb, options)
+        elif workers > 1:
+            self.smp = LazySMP(workers, hash_mb, options)
+        # The table this engine has to close itself. The table of Lazy SMP is closed with its helper processes.
+        self.own_tt: TranspositionTable | None = None
+        shared_hash = options.get(PONDER_HASH_OPTION)
+        if isinstance(shared_hash, str):
+            self.tt = self.own_tt = TranspositionTable.attach(shared_hash, hash_mb)
+        elif isinstance(self.smp, LazySMP):
+            self.tt = self.smp.tt
+        else:
+            # Moved to shared memory only if the engine ponders (see `ponder_options`).
+            self.tt = self.own_tt = TranspositionTable(hash_mb)
+        self.searcher = Searcher.from_options(self.tt, options)
+
+    def print_stats(self) -> None:
+        """Print the engine stats and the counters of the last search."""
+        super().print_stats()
+        for line in self.searcher.stats():
+            logger.info(line)
 
     def search(self, board: chess.Board, *args: HOMEMADE_ARGS_TYPE) -> PlayResult:
-        # NOTE: The sections below are intentionally simple to keep the example short.
-        # They demonstrate the structure of a search but also highlight the engine's
-        # weaknesses (fixed depth, naive time handling, no pruning, no quiescence, etc.).
-        # --- very simple time-based depth selection (naive) ---
+        """Search with iterative deepening until the time allocated from the game clock runs out."""
         # Expect args to be (time_limit: Limit, ponder: bool, draw_offered: bool, root_moves: MOVE)
         time_limit = args[0] if (args and isinstance(args[0], Limit)) else None
-        my_time = my_inc = None
-        if time_limit is not None:
-            if isinstance(time_limit.time, (int, float)):
-                my_time = time_limit.time
-                my_inc = 0
-            elif board.turn == chess.WHITE:
-                my_time = time_limit.white_clock if isinstance(time_limit.white_clock, (int, float)) else 0
-                my_inc = time_limit.white_inc if isinstance(time_limit.white_inc, (int, float)) else 0
-            else:
-                my_time = time_limit.black_clock if isinstance(time_limit.black_clock, (int, float)) else 0
-                my_inc = time_limit.black_inc if isinstance(time_limit.black_inc, (int, float)) else 0
-
-        # Map a rough time budget to a coarse fixed depth.
-        # Examples:
-        # - >= 60s: depth 4
-        # - >= 20s: depth 3
-        # - >= 5s:  depth 2
-        # - else:   depth 1
-        remaining = my_time if isinstance(my_time, (int, float)) else None
-        inc = my_inc if isinstance(my_inc, (int, float)) else 0
-        budget = (remaining or 0) + 2 * inc  # crude increment bonus
-        total_depth = 4
-        if(eval.num_pieces(board)<10):
-            total_depth=5 
-        if(eval.num_pieces(board)<7):
-            total_depth=6 
-        if(remaining<10):
-            total_depth=3    
-        startTime=time.time()
-
-        # up to what I've done before
-        # start with iterative deepening - mostly there with pv move ordering
-        # move onto transposition table
-        def traverseTree(b: chess.Board, depth: int, maximizing: bool, alpha, beta) -> int:
-            if(depth<2 and time.time()-startTime>4):
-                depth=0
-            if depth == 0 or b.is_game_over():
-                return eval.evaluate(b)   
-            scored_moves=[]
-            if maximizing:
-                best = -10**12
-                for m in b.legal_moves:
-                    b.push(m)
-                    strength = eval.evaluate(b)
-                    b.pop()
-                    scored_moves.append((m, strength))
-                scored_moves.sort(key=lambda x: x[1], reverse=True)
-                for m in scored_moves: 
-                    b.push(m[0])   
-                    val = traverseTree(b, depth - 1, False, alpha, beta)
-                    b.pop()
-                    if val > best:
-                        best = val
-                    if val > alpha:
-                        alpha=val   
-                    if(beta<=alpha):
-                        return best 
-                return best
-            else:
-                best = 10**12
-                for m in b.legal_moves:
-                    b.push(m)
-                    strength = eval.evaluate(b)
-                    b.pop()
-                    scored_moves.append((m, strength))
-                scored_moves.sort(key=lambda x: x[1], reverse=True)
-                for m in scored_moves: 
-                    b.push(m[0])  
-                    val = traverseTree(b, depth - 1, True, alpha, beta)
-                    b.pop()
-                    if val < best:
-                        best = val
-                    if val < beta:
-                        beta=val    
-                    if(beta<=alpha):
-                        return best 
-                return best
-
-        # --- root move selection ---
-        legal = list(board.legal_moves)
-        if not legal:
-            # Should not happen during normal play; fall back defensively
-            return PlayResult(random.choice(list(board.legal_moves)), None)
-
-        maximizing = board.turn == chess.WHITE
-        best_move = None
-        best_eval = -10**12 if maximizing else 10**12
-        alpha=-10**12
-        beta=10**12
-        vals=[]
-        # Lookahead depth chosen by the simple time heuristic; subtract one for the root move
-        for m in legal:
-            board.push(m)
-            val = traverseTree(board, total_depth - 1, not maximizing, alpha, beta)
-            board.pop()
-            vals.append(val)
-            if maximizing: 
-                if val > best_eval:
-                    best_eval, best_move = val, m
-            elif not maximizing: 
-                if val < best_eval:
-                    best_eval, best_move = val, m
-            
-
-        # Fallback in rare cases (shouldn't trigger)
-        print(best_eval, best_move, vals)
-        if best_move is None:
-            best_move = legal[0]
-        
-        return PlayResult(best_move, None)
\ No newline at end of file
+        self.searcher.stop_event = self.stop_event
+        if self.smp is not None:
+            return self.smp.search(self.searcher, board, time_limit)
+        return self.searcher.search(board, time_limit)
+
+    def ponder_options(self) -> OPTIONS_GO_EGTB_TYPE:
+        """
+        Make the instance that ponders search in this engine's transposition table, with one process.
+
+        The table is moved to shared memory with its entries the first time the engine ponders.
+        """
+        if self.tt.shared_memory is None:
+            shared = self.tt.to_shared()
+            self.tt.close()
+            self.tt = self.own_tt = self.searcher.tt = shared
+        assert self.tt.shared_memory is not None
+        return self.engine_args[1] | {"Threads": 1, "RootSplit": False, PONDER_HASH_OPTION: self.tt.shared_memory.name}
+
+    def ponder_hit_timeout(self, board: chess.Board, time_limit: Limit) -> float | None:
+        """Give the background search as long as a search of this move would get (its hard time limit)."""
+        return allocate_time(board, time_limit)[1]
+
+    def quit(self) -> None:
+        """Stop pondering and the helper search processes, and free the transposition table."""
+        super().quit()
+        if self.smp is not None:
+            self.smp.close()
+            self.smp = None
+        if self.own_tt is not None:
+            self.own_tt.close()
+            self.own_tt = None
+
+    def __exit__(self, exc_type: type[BaseException] | None,
+                 exc_value: BaseException | None,
+                 traceback: TracebackType | None) -> None:
+        """Stop the helper search processes even if the game ended with an exception."""
+        super().__exit__(exc_type, exc_value, traceback)
+        self.quit()
@@ -13,8 +13,11 @@ import time
 import random
 import math
 import contextlib
-from collections import Counter
-from collections.abc import Callable
+import multiprocessing
+import queue
+from collections import Counter, OrderedDict
+from collections.abc import Callable, Iterator
+from multiprocessing.synchronize import Event
 from lib import model, lichess
 from lib.config import Configuration, change_value_to_list
 from lib.timer import Timer, msec, seconds, msec_str, sec_str, to_seconds
@@ -31,6 +34,20 @@ logger = logging.getLogger(__name__)
 
 out_of_online_opening_book_moves: Counter[str] = Counter()
 
+# The local tablebases opened so far in this process, by their list of directories.
+syzygy_tablebases: dict[tuple[str, ...], chess.syzygy.Tablebase] = {}
+gaviota_tablebases: dict[tuple[str, ...], chess.gaviota.NativeTablebase | chess.gaviota.PythonTablebase] = {}
+
+# The DTM of the positions probed in the gaviota tablebases, by Zobrist hash, from the least recently used.
+GAVIOTA_PROBE_CACHE_SIZE = 16384
+gaviota_probes: OrderedDict[int, int] = OrderedDict()
+
+# The polyglot opening books opened so far in this process, by path.
+book_readers: dict[str, chess.polyglot.MemoryMappedReader] = {}
+
+PONDER_STOP_TIMEOUT = 1  # Seconds to wait for a homemade engine to stop pondering after it is told to stop.
+PONDER_HIT_MOVES_TO_GO = 30  # Moves assumed left in the game to share out the clock after a ponder hit.
+
 
 def create_engine(engine_config: Configuration, game: model.Game | None = None) -> EngineWrapper:
     """
@@ -66,6 +83,10 @@ def create_engine(engine_config: Configuration, game: model.Game | None = None)
         raise ValueError(
             f"    Invalid engine type: {engine_type}. Expected xboard, uci, or homemade.")
     options = remove_managed_options(cfg.lookup(f"{engine_type}_options") or Configuration({}))
+    if engine_type == "homemade":
+        # Homemade engines that search in several processes need this to share the cores between games.
+        challenge_config = engine_config.lookup("challenge")
+        options.setdefault("concurrency", challenge_config.concurrency if challenge_config else 1)
     logger.debug(f"Starting engine: {commands}")
     return Engine(commands, options, stderr, cfg.draw_or_resign, game, cwd=cfg.working_dir)
 
@@ -158,6 +179,8 @@ class EngineWrapper:
         draw_or_resign_cfg = engine_cfg.draw_or_resign
         lichess_bot_tbs = engine_cfg.lichess_bot_tbs
 
+        ponder_limit = None
+
         best_move: MOVE
         best_move = get_book_move(board, game, polyglot_cfg)
 
@@ -181,8 +204,14 @@ class EngineWrapper:
                                                setup_timer, move_overhead,
                                                is_correspondence, correspondence_move_time)
 
+            # Only wait for the result of pondering when the engine would search, not for a book or tablebase move.
+            ponder_result = self.stop_pondering(board)
             try:
-                best_move = self.search(board, time_limit, can_ponder, draw_offered, best_move)
+                if ponder_result is not None and (not isinstance(best_move, list) or ponder_result.move in best_move):
+                    best_move = self.check_result(ponder_result, board)
+                else:
+                    best_move = self.search(board, time_limit, can_ponder, draw_offered, best_move)
+                ponder_limit = time_limit if can_ponder else None
             except chess.engine.EngineError as error:
                 BadMove = (chess.IllegalMoveError, chess.InvalidMoveError)
                 if not any(isinstance(e, BadMove) for e in error.args):
@@ -192,6 +221,8 @@ class EngineWrapper:
                 game_ender = li.abort if game.is_abortable() else li.resign
                 game_ender(game.id)
                 return
+        else:
+            self.stop_pondering(board, wait=False)
 
         # Heed min_time
         elapsed = setup_timer.time_since_reset()
@@ -204,6 +235,30 @@ class EngineWrapper:
             li.resign(game.id)
         else:
             li.make_move(game.id, best_move)
+            if ponder_limit is not None:
+                self.start_pondering(board, best_move, ponder_limit)
+
+    def start_pondering(self, board: chess.Board, result: chess.engine.PlayResult, time_limit: chess.engine.Limit) -> None:
+        """
+        Think on the opponent's time.
+
+        Engines using the UCI or XBoard protocols ponder through python-chess, so this is only used by homemade engines.
+
+        :param board: The position before the move in `result` is played.
+        :param result: The move played and the expected reply.
+        :param time_limit: The time control of the move played.
+        """
+
+    def stop_pondering(self, board: chess.Board, *, wait: bool = True) -> chess.engine.PlayResult | None:  # noqa: ARG002
+        """
+        Stop thinking on the opponent's time.
+
+        :param board: The current position.
+        :param wait: Whether to wait for the result if the opponent played the expected reply. If not, pondering is
+            stopped as if they hadn't.
+        :return: The result of pondering if the opponent played the expected reply and `wait` is true, else None.
+        """
+        return None
 
     def add_go_commands(self, time_limit: chess.engine.Limit) -> chess.engine.Limit:
         """Add extra commands to send to the engine. For example, to search for 1000 nodes or up to depth 10."""
@@ -266,6 +321,10 @@ class EngineWrapper:
                                   ponder=ponder,
                                   draw_offered=draw_offered,
                                   root_moves=root_moves if isinstance(root_moves, list) else None)
+        return self.check_result(result, board)
+
+    def check_result(self, result: chess.engine.PlayResult, board: chess.Board) -> chess.engine.PlayResult:
+        """Record the score of a search of `board`, and offer a draw or resign depending on the scores so far."""
         # Use null_score to have no effect on draw/resign decisions
         null_score = chess.engine.PovScore(chess.engine.Mate(1), board.turn)
         self.scores.append(result.info.get("score", null_score))
@@ -538,9 +597,9 @@ class MinimalEngine(EngineWrapper):
     `notify`, etc.
     """
 
-    def __init__(self, commands: COMMANDS_TYPE, options: OPTIONS_GO_EGTB_TYPE, stderr: int | None,  # noqa: ARG002
+    def __init__(self, commands: COMMANDS_TYPE, options: OPTIONS_GO_EGTB_TYPE, stderr: int | None,
                  draw_or_resign: Configuration, game: model.Game | None = None, name: str | None = None,  # noqa: ARG002
-                 **popen_args: str) -> None:  # noqa: ARG002 Unused argument popen_args
+                 **popen_args: str) -> None:
         """
         Initialize the values of the engine that all homemade engines inherit.
 
@@ -553,10 +612,170 @@ class MinimalEngine(EngineWrapper):
 
         self.engine = FillerEngine(self, name=self.engine_name)
 
+        # Pondering is done by another instance of the engine in a background process.
+        self.engine_args = (commands, options, stderr, draw_or_resign)
+        self.popen_args = popen_args
+        self.stop_event: Event | None = None  # Set when a background search has to stop (see `stop_pondering`).
+        self.ponder_process: multiprocessing.process.BaseProcess | None = None
+        self.ponder_tasks: multiprocessing.Queue[tuple[int, chess.Board, chess.engine.Limit] | None] | None = None
+        self.ponder_results: multiprocessing.Queue[tuple[int, chess.engine.PlayResult | None]] | None = None
+        self.ponder_stop_event: Event | None = None
+        self.ponder_id = 0
+        self.ponder_board: chess.Board | None = None
+        self.ponder_limit: chess.engine.Limit | None = None
+
     def get_pid(self) -> str:
         """Homemade engines don't have a pid, so we return a question mark."""
         return "?"
 
+    def start_pondering(self, board: chess.Board, result: chess.engine.PlayResult, time_limit: chess.engine.Limit) -> None:
+        """
+        Search the position after the move played and the expected reply in a background process.
+
+        The background search gets the same time control as the move played. Engines whose search checks
+        `self.stop_event` stop as soon as the opponent plays another move.
+
+        :param board: The position before the move in `result` is played.
+        :param result: The move played and the expected reply.
+        :param time_limit: The time control of the move played.
+        """
+        if result.move is None or result.ponder is None:
+            return
+        if self.ponder_process is None or not self.ponder_process.is_alive():
+            self.start_ponder_process()
+        assert self.ponder_tasks is not None
+        self.ponder_board = board.copy()
+        self.ponder_board.push(result.move)
+        self.ponder_board.push(result.ponder)
+        self.ponder_limit = time_limit
+        self.ponder_id += 1
+        self.ponder_tasks.put((self.ponder_id, self.ponder_board, time_limit))
+
+    def stop_pondering(self, board: chess.Board, *, wait: bool = True) -> chess.engine.PlayResult | None:
+        """
+        Stop the background search, or wait for its result if the opponent played the expected reply.
+
+        :param board: The current position.
+        :param wait: Whether to wait for the result on a ponder hit. If not, the background search is stopped as on a
+            miss, e.g. when the move is taken from an opening book.
+        :return: The result of the background search on a ponder hit, else None.
+        """
+        if self.ponder_board is None or self.ponder_limit is None:
+            return None
+        hit = wait and board.move_stack == self.ponder_board.move_stack
+        if hit:
+            # The background search can take as long as a search started now would, then it is told to stop.
+            timeout = self.ponder_hit_timeout(board, self.ponder_limit)
+        else:
+            assert self.ponder_stop_event is not None
+            self.ponder_stop_event.set()
+            timeout = PONDER_STOP_TIMEOUT
+        self.ponder_board = self.ponder_limit = None
+        result = self.ponder_result(timeout)
+        if self.ponder_stop_event is not None:
+            self.ponder_stop_event.clear()
+        logger.info(f"Ponder {'hit' if hit else 'miss'}.")
+        return result if hit else None
+
+    def ponder_hit_timeout(self, board: chess.Board, time_limit: chess.engine.Limit) -> float | None:
+        """
+        Get how long to wait for the background search after a ponder hit before telling it to stop.
+
+        This should be the time the engine would give a search of `board` started now. Engines that allocate their time
+        differently should override it. By default, it is the fixed time per move if there is one, else an even share of
+        the clock over the moves left (or `PONDER_HIT_MOVES_TO_GO` moves) plus the increment.
+
+        :param board: The current position.
+        :param time_limit: The time control of the move before the opponent's reply.
+        :return: The time in seconds, or None to wait until the search is done if there is no time limit.
+        """
+        if isinstance(time_limit.time, (int, float)):
+            return float(time_limit.time)
+        clock = time_limit.white_clock if board.turn == chess.WHITE else time_limit.black_clock
+        if not isinstance(clock, (int, float)):
+            return None
+        increment = time_limit.white_inc if board.turn == chess.WHITE else time_limit.black_inc
+        increment = increment if isinstance(increment, (int, float)) else 0
+        return min(float(clock), clock / (time_limit.remaining_moves or PONDER_HIT_MOVES_TO_GO) + increment)
+
+    def ponder_result(self, timeout: float | None) -> chess.engine.PlayResult | None:
+        """
+        Wait for the result of the last background search.
+
+        If the search takes longer than `timeout` seconds (None to wait until the search is done), it is told to stop
+        and the result it found so far is used. If it doesn't stop within `PONDER_STOP_TIMEOUT` seconds either, the
+        background process is stopped. It is started again the next time the engine ponders.
+        """
+        assert self.ponder_results is not None and self.ponder_stop_event is not None
+        give_up = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                ponder_id, result = self.ponder_results.get(
+                    timeout=None if give_up is None else max(0.0, give_up - time.monotonic()))
+            except queue.Empty:
+                if not self.ponder_stop_event.is_set():
+                    self.ponder_stop_event.set()
+                    give_up = time.monotonic() + PONDER_STOP_TIMEOUT
+                    continue
+                logger.warning("The engine did not stop pondering in time.")
+                self.stop_ponder_process()
+                return None
+            if ponder_id == self.ponder_id:
+                return result
+
+    def start_ponder_process(self) -> None:
+        """Start the background process that ponders with another instance of this engine."""
+        context = multiprocessing.get_context("spawn")
+        self.ponder_tasks = context.Queue()
+        self.ponder_results = context.Queue()
+        self.ponder_stop_event = context.Event()
+        with allow_child_processes():
+            commands, _, stderr, draw_or_resign = self.engine_args
+            process = context.Process(target=ponder_worker,
+                                      args=(type(self), (commands, self.ponder_options(), stderr, draw_or_resign),
+                                            self.popen_args),
+                                      kwargs={"tasks": self.ponder_tasks, "results": self.ponder_results,
+                                              "stop_event": self.ponder_stop_event},
+                                      daemon=True)
+            process.start()
+        self.ponder_process = process
+
+    def ponder_options(self) -> OPTIONS_GO_EGTB_TYPE:
+        """
+        Get the options of the instance of this engine that ponders in the background.
+
+        By default, it gets the same options as this engine, so it takes as much memory and as many processes again.
+        Engines can override this to share memory with it or to make it search with fewer processes.
+        """
+        return self.engine_args[1]
+
+    def stop_ponder_process(self) -> None:
+        """Stop the background process that ponders."""
+        if self.ponder_process is None:
+            return
+        assert self.ponder_tasks is not None and self.ponder_stop_event is not None
+        self.ponder_stop_event.set()
+        self.ponder_tasks.put(None)
+        self.ponder_process.join(timeout=PONDER_STOP_TIMEOUT)
+        if self.ponder_process.is_alive():
+            self.ponder_process.terminate()
+        self.ponder_process = None
+        self.ponder_board = self.ponder_limit = None
+
+    def quit(self) -> None:
+        """Stop pondering and tell the engine to shut down."""
+        self.stop_ponder_process()
+        super().quit()
+
+    def __exit__(self, exc_type: type[BaseException] | None,
+                 exc_value: BaseException | None,
+                 traceback: TracebackType | None) -> None:
+        """Exit like other engines, and stop pondering even if the game ended with an exception."""
+        try:
+            super().__exit__(exc_type, exc_value, traceback)
+        finally:
+            self.stop_ponder_process()
+
     def search(self, board: chess.Board, time_limit: chess.engine.Limit, ponder: bool, draw_offered: bool,
                root_moves: MOVE) -> chess.engine.PlayResult:
         """
@@ -612,6 +831,56 @@ class FillerEngine:
         return method
 
 
+@contextlib.contextmanager
+def allow_child_processes() -> Iterator[None]:
+    """
+    Allow the current process to start worker processes even if it is daemonic.
+
+    lichess-bot plays each game in a daemonic process of a `multiprocessing.Pool`, and python refuses to start
+    processes from daemonic processes because they could be orphaned. The workers are daemonic themselves and are
+    shut down by the engine when the game ends.
+    """
+    process = multiprocessing.current_process()
+    daemon = process.daemon
+    process.daemon = False
+    try:
+        yield
+    finally:
+        process.daemon = daemon
+
+
+def ponder_worker(engine_class: type[MinimalEngine],
+                  engine_args: tuple[COMMANDS_TYPE, OPTIONS_GO_EGTB_TYPE, int | None, Configuration],
+                  popen_args: dict[str, str], *,
+                  tasks: multiprocessing.Queue[tuple[int, chess.Board, chess.engine.Limit] | None],
+                  results: multiprocessing.Queue[tuple[int, chess.engine.PlayResult | None]],
+                  stop_event: Event) -> None:
+    """
+    Ponder for a homemade engine until told to quit.
+
+    :param engine_class: The class of the homemade engine. A new instance is used for pondering.
+    :param engine_args: The arguments the homemade engine was created with.
+    :param popen_args: The keyword arguments the homemade engine was created with.
+    :param tasks: The positions to search with their time controls, each with an id sent back with the result.
+    :param results: Where the results are sent.
+    :param stop_event: Set when the search has to stop. Given to the engine as `stop_event`.
+    """
+    commands, options, stderr, draw_or_resign = engine_args
+    engine = engine_class(commands, options, stderr, draw_or_resign, None, **popen_args)
+    engine.stop_event = stop_event
+    try:
+        while (task := tasks.get()) is not None:
+            ponder_id, board, time_limit = task
+            result: chess.engine.PlayResult | None = None
+            try:
+                result = engine.search(board, time_limit, False, False, chess.engine.PlayResult(None, None))
+            except Exception:
+                logger.exception("Error while pondering.")
+            results.put((ponder_id, result))
+    finally:
+        engine.quit()
+
+
 test_suffix = "-for-lichess-bot-testing-only"
 
 
@@ -750,26 +1019,7 @@ def get_book_move(board: chess.Board, game: model.Game,
     books = polyglot_cfg.book.lookup(variant)
 
     for book in books:
-        with chess.polyglot.open_reader(book) as reader:
-            try:
-                selection = polyglot_cfg.selection
-                min_weight = polyglot_cfg.min_weight
-                normalization = polyglot_cfg.normalization
-                weights = [entry.weight for entry in reader.find_all(board)]
-                scalar = (sum(weights) if normalization == "sum" and weights else
-                          max(weights) if normalization == "max" and weights else 100)
-                min_weight = min_weight * scalar / 100
-
-                if selection == "weighted_random":
-                    move = reader.weighted_choice(board).move
-                elif selection == "uniform_random":
-                    move = reader.choice(board, minimum_weight=min_weight).move
-                elif selection == "best_move":
-                    move = reader.find(board, minimum_weight=min_weight).move
-            except IndexError:
-                # python-chess raises "IndexError" if no entries found.
-                move = None
-
+        move = select_book_move(list(open_book(book).find_all(board, minimum_weight=0)), polyglot_cfg)
         if move is not None:
             logger.info(f"Got move {move} from book {book} for game {game.id}")
             return chess.engine.PlayResult(move, None, {"string": "lichess-bot-source:Opening Book"})
@@ -777,6 +1027,42 @@ def get_book_move(board: chess.Board, game: model.Game,
     return no_book_move
 
 
+def open_book(path: str) -> chess.polyglot.MemoryMappedReader:
+    """
+    Get the reader of a polyglot opening book, opening it the first time it is asked for.
+
+    The books stay open (memory mapped) for the life of the process, so a move from a book does not have to open it.
+    """
+    if path not in book_readers:
+        book_readers[path] = chess.polyglot.open_reader(path)
+    return book_readers[path]
+
+
+def select_book_move(entries: list[chess.polyglot.Entry], polyglot_cfg: Configuration) -> chess.Move | None:
+    """
+    Choose a move among the book entries of a position, as configured in `polyglot_cfg`.
+
+    The entries are looked up once, with weights of 0 included, and every selection method picks from that list, the
+    way python-chess's `weighted_choice`, `choice` and `find` would pick from the book.
+    """
+    weighted = [entry for entry in entries if entry.weight >= 1]
+    weights = [entry.weight for entry in weighted]
+    normalization = polyglot_cfg.normalization
+    scalar = (sum(weights) if normalization == "sum" and weights else
+              max(weights) if normalization == "max" and weights else 100)
+    min_weight = polyglot_cfg.min_weight * scalar / 100
+    candidates = [entry for entry in entries if entry.weight >= min_weight]
+
+    selection = polyglot_cfg.selection
+    if selection == "weighted_random":
+        return random.choices(weighted, weights=weights)[0].move if weighted else None
+    if not candidates:
+        return None
+    if selection == "uniform_random":
+        return random.choice(candidates).move
+    return max(candidates, key=lambda entry: entry.weight).move
+
+
 def get_online_move(li: lichess.Lichess, board: chess.Board, game: model.Game, online_moves_cfg: Configuration,
                     draw_or_resign_cfg: Configuration) -> chess.engine.PlayResult | list[chess.Move]:
     """
@@ -1161,42 +1447,55 @@ def get_syzygy(board: chess.Board, game: model.Game,
     move: chess.Move | list[chess.Move]
     move_quality = syzygy_cfg.move_quality
 
-    with chess.syzygy.open_tablebase(syzygy_cfg.paths[0]) as tablebase:
-        for path in syzygy_cfg.paths[1:]:
-            tablebase.add_directory(path)
+    tablebase = open_syzygy(syzygy_cfg.paths)
+    try:
+        moves = score_syzygy_moves(board, dtz_scorer, tablebase)
 
+        best_wdl = max(map(dtz_to_wdl, moves.values()))
+        good_moves = [(move, dtz) for move, dtz in moves.items() if dtz_to_wdl(dtz) == best_wdl]
+        if move_quality == "suggest" and len(good_moves) > 1:
+            move = [chess_move for chess_move, dtz in good_moves]
+            logger.info(f"Suggesting moves from syzygy (wdl: {best_wdl}) for game {game.id}")
+            return move, best_wdl
+        # There can be multiple moves with the same dtz.
+        best_dtz = min(good_moves, key=itemgetter(1))[1]
+        best_moves = [chess_move for chess_move, dtz in good_moves if dtz == best_dtz]
+        move = random.choice(best_moves)
+        logger.info(f"Got move {move.uci()} from syzygy (wdl: {best_wdl}, dtz: {best_dtz}) for game {game.id}")
+        return move, best_wdl
+    except KeyError:
+        # Attempt to only get the WDL score. It returns moves of quality="suggest", even if quality is set to "best".
         try:
-            moves = score_syzygy_moves(board, dtz_scorer, tablebase)
-
-            best_wdl = max(map(dtz_to_wdl, moves.values()))
-            good_moves = [(move, dtz) for move, dtz in moves.items() if dtz_to_wdl(dtz) == best_wdl]
-            if move_quality == "suggest" and len(good_moves) > 1:
-                move = [chess_move for chess_move, dtz in good_moves]
+            moves = score_syzygy_moves(board, lambda tablebase, b: -tablebase.probe_wdl(b), tablebase)
+            best_wdl = int(max(moves.values()))  # int is there only for mypy.
+            good_chess_moves = [chess_move for chess_move, wdl in moves.items() if wdl == best_wdl]
+            logger.debug("Found moves using 'move_quality'='suggest'. We didn't find an '.rtbz' file for this endgame."
+                         if move_quality == "best" else "")
+            if len(good_chess_moves) > 1:
+                move = good_chess_moves
                 logger.info(f"Suggesting moves from syzygy (wdl: {best_wdl}) for game {game.id}")
-                return move, best_wdl
-            # There can be multiple moves with the same dtz.
-            best_dtz = min(good_moves, key=itemgetter(1))[1]
-            best_moves = [chess_move for chess_move, dtz in good_moves if dtz == best_dtz]
-            move = random.choice(best_moves)
-            logger.info(f"Got move {move.uci()} from syzygy (wdl: {best_wdl}, dtz: {best_dtz}) for game {game.id}")
+            else:
+                move = good_chess_moves[0]
+                logger.info(f"Got move {move.uci()} from syzygy (wdl: {best_wdl}) for game {game.id}")
             return move, best_wdl
         except KeyError:
-            # Attempt to only get the WDL score. It returns moves of quality="suggest", even if quality is set to "best".
-            try:
-                moves = score_syzygy_moves(board, lambda tablebase, b: -tablebase.probe_wdl(b), tablebase)
-                best_wdl = int(max(moves.values()))  # int is there only for mypy.
-                good_chess_moves = [chess_move for chess_move, wdl in moves.items() if wdl == best_wdl]
-                logger.debug("Found moves using 'move_quality'='suggest'. We didn't find an '.rtbz' file for this endgame."
-                             if move_quality == "best" else "")
-                if len(good_chess_moves) > 1:
-                    move = good_chess_moves
-                    logger.info(f"Suggesting moves from syzygy (wdl: {best_wdl}) for game {game.id}")
-                else:
-                    move = good_chess_moves[0]
-                    logger.info(f"Got move {move.uci()} from syzygy (wdl: {best_wdl}) for game {game.id}")
-                return move, best_wdl
-            except KeyError:
-                return None, -3
+            return None, -3
+
+
+def open_syzygy(paths: list[str]) -> chess.syzygy.Tablebase:
+    """
+    Get the syzygy tablebases in `paths`, opening them the first time they are asked for.
+
+    The tablebases stay open for the life of the process, so the directories are scanned once instead of on every move,
+    and the files opened by earlier probes are reused.
+    """
+    key = tuple(paths)
+    if key not in syzygy_tablebases:
+        tablebase = chess.syzygy.open_tablebase(paths[0])
+        for path in paths[1:]:
+            tablebase.add_directory(path)
+        syzygy_tablebases[key] = tablebase
+    return syzygy_tablebases[key]
 
 
 def dtz_scorer(tablebase: chess.syzygy.Tablebase, board: chess.Board) -> int | float:
@@ -1243,40 +1542,68 @@ def get_gaviota(board: chess.Board, game: model.Game,
     # because dtm >= dtz, so if abs(dtm) < 100 => abs(dtz) < 100, so wdl=2/-2.
     min_dtm_to_consider_as_wdl_1 = gaviota_cfg.min_dtm_to_consider_as_wdl_1
 
-    with chess.gaviota.open_tablebase(gaviota_cfg.paths[0]) as tablebase:
-        for path in gaviota_cfg.paths[1:]:
-            tablebase.add_directory(path)
+    tablebase = open_gaviota(gaviota_cfg.paths)
+    try:
+        moves = score_gaviota_moves(board, dtm_scorer, tablebase)
 
-        try:
-            moves = score_gaviota_moves(board, dtm_scorer, tablebase)
-
-            best_wdl = max(map(dtm_to_gaviota_wdl, moves.values()))
-            good_moves = [(move, dtm) for move, dtm in moves.items() if dtm_to_gaviota_wdl(dtm) == best_wdl]
-            best_dtm = min(good_moves, key=itemgetter(1))[1]
-
-            pseudo_wdl = dtm_to_wdl(best_dtm, min_dtm_to_consider_as_wdl_1)
-            if move_quality == "suggest":
-                best_moves = good_enough_gaviota_moves(good_moves, best_dtm, min_dtm_to_consider_as_wdl_1)
-                if len(best_moves) > 1:
-                    move = [chess_move for chess_move, dtm in best_moves]
-                    logger.info(f"Suggesting moves from gaviota (pseudo wdl: {pseudo_wdl}) for game {game.id}")
-                else:
-                    move, dtm = best_moves[0]
-                    logger.info(f"Got move {move.uci()} from gaviota (pseudo wdl: {pseudo_wdl}, dtm: {dtm})"
-                                f" for game {game.id}")
+        best_wdl = max(map(dtm_to_gaviota_wdl, moves.values()))
+        good_moves = [(move, dtm) for move, dtm in moves.items() if dtm_to_gaviota_wdl(dtm) == best_wdl]
+        best_dtm = min(good_moves, key=itemgetter(1))[1]
+
+        pseudo_wdl = dtm_to_wdl(best_dtm, min_dtm_to_consider_as_wdl_1)
+        if move_quality == "suggest":
+            best_moves = good_enough_gaviota_moves(good_moves, best_dtm, min_dtm_to_consider_as_wdl_1)
+            if len(best_moves) > 1:
+                move = [chess_move for chess_move, dtm in best_moves]
+                logger.info(f"Suggesting moves from gaviota (pseudo wdl: {pseudo_wdl}) for game {game.id}")
             else:
-                # There can be multiple moves with the same dtm.
-                best_moves = [(move, dtm) for move, dtm in good_moves if dtm == best_dtm]
-                move, dtm = random.choice(best_moves)
-                logger.info(f"Got move {move.uci()} from gaviota (pseudo wdl: {pseudo_wdl}, dtm: {dtm}) for game {game.id}")
-            return move, pseudo_wdl
-        except KeyError:
-            return None, -3
+                move, dtm = best_moves[0]
+                logger.info(f"Got move {move.uci()} from gaviota (pseudo wdl: {pseudo_wdl}, dtm: {dtm})"
+                            f" for game {game.id}")
+        else:
+            # There can be multiple moves with the same dtm.
+            best_moves = [(move, dtm) for move, dtm in good_moves if dtm == best_dtm]
+            move, dtm = random.choice(best_moves)
+            logger.info(f"Got move {move.uci()} from gaviota (pseudo wdl: {pseudo_wdl}, dtm: {dtm}) for game {game.id}")
+        return move, pseudo_wdl
+    except KeyError:
+        return None, -3
+
+
+def open_gaviota(paths: list[str]) -> chess.gaviota.NativeTablebase | chess.gaviota.PythonTablebase:
+    """Get the gaviota tablebases in `paths`, opening them the first time they are asked for, like `open_syzygy`."""
+    key = tuple(paths)
+    if key not in gaviota_tablebases:
+        tablebase = chess.gaviota.open_tablebase(paths[0])
+        for path in paths[1:]:
+            tablebase.add_directory(path)
+        gaviota_tablebases[key] = tablebase
+    return gaviota_tablebases[key]
+
+
+def probe_gaviota_dtm(tablebase: chess.gaviota.NativeTablebase | chess.gaviota.PythonTablebase,
+                      board: chess.Board) -> int:
+    """
+    Get the DTM of a position from the gaviota tablebases, or from the cache if it was probed before.
+
+    Consecutive moves of an endgame score mostly the same positions, so most probes after the first move are cached.
+    The DTM does not depend on the halfmove clock, so positions that only differ by it share an entry.
+    """
+    key = chess.polyglot.zobrist_hash(board)
+    dtm = gaviota_probes.get(key)
+    if dtm is None:
+        dtm = tablebase.probe_dtm(board)
+        gaviota_probes[key] = dtm
+        if len(gaviota_probes) > GAVIOTA_PROBE_CACHE_SIZE:
+            gaviota_probes.popitem(last=False)
+    else:
+        gaviota_probes.move_to_end(key)
+    return dtm
 
 
 def dtm_scorer(tablebase: chess.gaviota.NativeTablebase | chess.gaviota.PythonTablebase, board: chess.Board) -> int:
     """Score a position based on a gaviota DTM egtb."""
-    dtm = -tablebase.probe_dtm(board)
+    dtm = -probe_gaviota_dtm(tablebase, board)
     return dtm + int(math.copysign(board.halfmove_clock, dtm) if dtm else 0)
 
 
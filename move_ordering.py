@@ -0,0 +1,149 @@
+"""Move ordering for the homemade engine's search. Nothing here pushes moves on the board."""
+import itertools
+import time
+import chess
+import eval
+
+MAX_PLY = 128
+
+# Sort keys of each kind of move. Moves are searched in decreasing order of their key.
+TT_MOVE_SCORE = 1 << 30
+GOOD_CAPTURE_SCORE = 1 << 28  # Captures that don't obviously lose material, and promotions.
+KILLER_SCORE = 1 << 27
+BAD_CAPTURE_SCORE = 1 << 26  # A more valuable piece takes a defended, less valuable piece.
+HISTORY_MAX = 1 << 20  # History scores are halved when one of them gets this big, so they stay below BAD_CAPTURE_SCORE.
+
+PROMOTION_SQUARES = chess.BB_RANK_1 | chess.BB_RANK_8
+
+
+class MoveOrderer:
+    """
+    Order moves with the transposition table move, MVV-LVA, killer moves and a butterfly history table.
+
+    The orderer also measures how long ordering takes and how often the first move searched causes a beta cutoff,
+    which is the best single measure of how good the ordering is.
+    """
+
+    def __init__(self) -> None:
+        """Create empty killer and history tables."""
+        self.killers: list[list[chess.Move | None]] = [[None, None] for _ in range(MAX_PLY + 1)]
+        self.history = [0] * (2 * 64 * 64)  # Indexed by [color][from square][to square].
+        self.reset_stats()
+
+    def clear(self) -> None:
+        """Forget the killer moves and the history scores."""
+        for killers in self.killers:
+            killers[0] = killers[1] = None
+        self.history = [0] * (2 * 64 * 64)
+
+    def age(self) -> None:
+        """
+        Keep the killer moves and the history scores for the next move of the game, with less weight.
+
+        Two plies have been played since the last search, so the killer moves move two plies closer to the root.
+        """
+        self.killers = self.killers[2:] + [[None, None] for _ in range(2)]
+        self.history = [score // 2 for score in self.history]
+
+    def reset_stats(self) -> None:
+        """Reset the ordering counters."""
+        self.ordering_time = 0.0
+        self.ordered_nodes = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def order(self, b: chess.Board, tt_move: chess.Move | None, ply: int,
+              quiet_scores: dict[chess.Move, int] | None = None) -> list[chess.Move]:
+        """
+        Get the legal moves, best first.
+
+        :param b: The current position.
+        :param tt_move: The best move stored in the transposition table, if any.
+        :param ply: The distance from the root, used to look up the killer moves.
+        :param quiet_scores: Sort keys of the quiet moves to use instead of their history scores, if any.
+        """
+        start = time.perf_counter()
+        killers = self.killers[min(ply, MAX_PLY)]
+        history = self.history
+        color_offset = 0 if b.turn == chess.WHITE else 64 * 64
+        them = not b.turn
+        scored = []
+        for m in b.legal_moves:
+            if m == tt_move:
+                score = TT_MOVE_SCORE
+            elif b.is_capture(m):
+                victim = chess.PAWN if b.is_en_passant(m) else b.piece_type_at(m.to_square) or chess.PAWN
+                attacker = b.piece_type_at(m.from_square) or chess.PAWN
+                score = victim * 8 - attacker
+                if eval.PIECE_VALUES[attacker] > eval.PIECE_VALUES[victim] and b.is_attacked_by(them, m.to_square):
+                    score += BAD_CAPTURE_SCORE
+                else:
+                    score += GOOD_CAPTURE_SCORE + (m.promotion or 0) * 64
+            elif m.promotion:
+                score = GOOD_CAPTURE_SCORE + m.promotion * 8
+            elif m == killers[0]:
+                score = KILLER_SCORE + 1
+            elif m == killers[1]:
+                score = KILLER_SCORE
+            elif quiet_scores is not None:
+                score = quiet_scores[m]
+            else:
+                score = history[color_offset + m.from_square * 64 + m.to_square]
+            scored.append((score, m))
+        scored.sort(key=lambda x: x[0], reverse=True)
+        self.ordered_nodes += 1
+        self.ordering_time += time.perf_counter() - start
+        return [m for _, m in scored]
+
+    def tactical_moves(self, b: chess.Board) -> list[tuple[chess.Move, int]]:
+        """
+        Get the legal captures and promotions with the material they win, most valuable victim first.
+
+        Ties are broken by searching captures with the least valuable attacker first.
+        """
+        quiet_promotions = b.generate_legal_moves(b.pawns & b.occupied_co[b.turn], PROMOTION_SQUARES & ~b.occupied)
+        moves = []
+        for m in itertools.chain(b.generate_legal_captures(), quiet_promotions):
+            victim = chess.PAWN if b.is_en_passant(m) else b.piece_type_at(m.to_square)
+            gain = eval.PIECE_VALUES[victim] if victim else 0
+            if m.promotion:
+                gain += eval.PIECE_VALUES[m.promotion] - eval.PIECE_VALUES[chess.PAWN]
+            attacker = b.piece_type_at(m.from_square) or chess.PAWN
+            moves.append((m, gain, eval.PIECE_VALUES[attacker]))
+        moves.sort(key=lambda x: (-x[1], x[2]))
+        return [(m, gain) for m, gain, _ in moves]
+
+    def record_cutoff(self, b: chess.Board, move: chess.Move, depth: int, ply: int, move_number: int) -> None:
+        """
+        Learn from a move that caused a beta cutoff.
+
+        Quiet moves become killer moves at this ply and get a history bonus that grows with the depth of the search.
+
+        :param b: The position before the move is played.
+        :param move: The move that caused the cutoff.
+        :param depth: The remaining depth of the search at this node.
+        :param ply: The distance from the root.
+        :param move_number: The index of the move in the searched order (0 for the first move).
+        """
+        self.cutoffs += 1
+        if move_number == 0:
+            self.first_move_cutoffs += 1
+        if b.is_capture(move) or move.promotion:
+            return
+
+        killers = self.killers[min(ply, MAX_PLY)]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+
+        index = (0 if b.turn == chess.WHITE else 64 * 64) + move.from_square * 64 + move.to_square
+        self.history[index] += depth * depth
+        if self.history[index] >= HISTORY_MAX:
+            self.history = [score // 2 for score in self.history]
+
+    def stats(self) -> str:
+        """Get a human-readable summary of the ordering counters."""
+        cost = self.ordering_time / self.ordered_nodes * 1e6 if self.ordered_nodes else 0.0
+        first_move_rate = self.first_move_cutoffs / self.cutoffs * 100 if self.cutoffs else 0.0
+        return (f"Ordering: {cost:.1f}us per node over {self.ordered_nodes} nodes, "
+                f"{first_move_rate:.1f}% of {self.cutoffs} cutoffs on the first move")
@@ -0,0 +1,195 @@
+"""
+An efficiently updatable neural network evaluation for the homemade engine, run on the CPU with NumPy.
+
+The network has one input per piece type, color and square (768 inputs, see `eval.plane`), a feature transformer into
+an accumulator of `hidden_size` int16 values, a clipped ReLU, a dense layer of int32 values, another clipped ReLU, and
+one output in centipawns from white's point of view.
+
+Only a few inputs change when a move is played, so the accumulator is updated on `push` by adding and subtracting the
+rows of the moved pieces instead of being computed again from all the pieces.
+
+Set `NNUEWeights` in `homemade_options` to the path of a weights file (see `Network.save`) to use it instead of the
+hand-written evaluation in `eval.py`.
+"""
+import os
+import numpy as np
+import numpy.typing as npt
+import chess
+import eval
+
+FEATURES = eval.PLANES * 64
+ACTIVATION_MAX = 127  # Both clipped ReLUs clip to [0, ACTIVATION_MAX].
+HIDDEN_SHIFT = 6  # The dense layer's sums are divided by 2 ** HIDDEN_SHIFT before its clipped ReLU.
+DEFAULT_HIDDEN_SIZE = 128
+DENSE_SIZE = 32
+
+Int16Array = npt.NDArray[np.int16]
+Int32Array = npt.NDArray[np.int32]
+
+
+def feature(color: chess.Color, piece_type: chess.PieceType, square: chess.Square) -> int:
+    """Get the input of a piece on a square."""
+    return eval.plane(color, piece_type) * 64 + square
+
+
+def board_features(b: chess.Board) -> list[int]:
+    """Get the inputs that are on in a position."""
+    return [plane * 64 + square for plane, bb in enumerate(eval.board_bitboards(b)) for square in chess.scan_forward(bb)]
+
+
+def move_features(b: chess.Board, m: chess.Move) -> tuple[list[int], list[int]]:
+    """
+    Get the inputs that change when `m` is played. `b` is the position before the move.
+
+    :return: The inputs turned on and the inputs turned off.
+    """
+    if not m:
+        return [], []  # null move
+    us = b.turn
+    from_square, to_square = m.from_square, m.to_square
+    piece_type = b.piece_type_at(from_square)
+    assert piece_type is not None
+    if piece_type == chess.KING and b.is_castling(m):
+        rank = chess.square_rank(from_square)
+        kingside = chess.square_file(to_square) > chess.square_file(from_square)
+        # Standard chess gives the king's destination, chess960 gives the square of the rook the king "captures".
+        rook_from = to_square if b.occupied_co[us] & chess.BB_SQUARES[to_square] else chess.square(7 if kingside else 0, rank)
+        return ([feature(us, chess.KING, chess.square(6 if kingside else 2, rank)),
+                 feature(us, chess.ROOK, chess.square(5 if kingside else 3, rank))],
+                [feature(us, chess.KING, from_square), feature(us, chess.ROOK, rook_from)])
+
+    added = [feature(us, m.promotion or piece_type, to_square)]
+    removed = [feature(us, piece_type, from_square)]
+    if b.is_en_passant(m):
+        removed.append(feature(not us, chess.PAWN, to_square - 8 if us == chess.WHITE else to_square + 8))
+    else:
+        captured = b.piece_type_at(to_square)
+        if captured:
+            removed.append(feature(not us, captured, to_square))
+    return added, removed
+
+
+class Network:
+    """The quantized weights of the network."""
+
+    def __init__(self, feature_weights: Int16Array, feature_bias: Int16Array, dense_weights: Int32Array,
+                 dense_bias: Int32Array, output_weights: Int32Array, *, output_bias: int, output_scale: int) -> None:
+        """
+        Check the shapes of the weights and keep them in the types used for the computation.
+
+        :param feature_weights: The row added to the accumulator by each input, shape (768, hidden size).
+        :param feature_bias: The starting value of the accumulator, shape (hidden size,).
+        :param dense_weights: Shape (hidden size, dense size).
+        :param dense_bias: Shape (dense size,).
+        :param output_weights: Shape (dense size,).
+        :param output_bias: Added to the output.
+        :param output_scale: The output is divided by this to get centipawns.
+        """
+        hidden_size = feature_bias.shape[0]
+        if (feature_weights.shape != (FEATURES, hidden_size) or dense_weights.shape[0] != hidden_size
+                or dense_bias.shape != (dense_weights.shape[1],) or output_weights.shape != dense_bias.shape):
+            raise ValueError("The shapes of the network weights don't fit together.")
+        self.feature_weights = feature_weights.astype(np.int16)
+        self.feature_bias = feature_bias.astype(np.int16)
+        self.dense_weights = dense_weights.astype(np.int32)
+        self.dense_bias = dense_bias.astype(np.int32)
+        self.output_weights = output_weights.astype(np.int32)
+        self.output_bias = int(output_bias)
+        self.output_scale = max(1, int(output_scale))
+
+    @classmethod
+    def load(cls, path: str) -> "Network":
+        """Read a network saved with `save`."""
+        with np.load(os.path.expanduser(path)) as weights:
+            return cls(weights["feature_weights"], weights["feature_bias"], weights["dense_weights"],
+                       weights["dense_bias"], weights["output_weights"], output_bias=int(weights["output_bias"]),
+                       output_scale=int(weights["output_scale"]))
+
+    def save(self, path: str) -> None:
+        """Write the network to an `.npz` file."""
+        np.savez(os.path.expanduser(path), feature_weights=self.feature_weights, feature_bias=self.feature_bias,
+                 dense_weights=self.dense_weights, dense_bias=self.dense_bias, output_weights=self.output_weights,
+                 output_bias=np.array(self.output_bias), output_scale=np.array(self.output_scale))
+
+    @classmethod
+    def random(cls, hidden_size: int = DEFAULT_HIDDEN_SIZE, seed: int = 0) -> "Network":
+        """Get an untrained network with small random weights, for tests and benchmarks."""
+        rng = np.random.default_rng(seed)
+        return cls(rng.integers(-8, 9, (FEATURES, hidden_size), dtype=np.int16),
+                   rng.integers(0, 32, hidden_size, dtype=np.int16),
+                   rng.integers(-16, 17, (hidden_size, DENSE_SIZE), dtype=np.int32),
+                   np.zeros(DENSE_SIZE, dtype=np.int32),
+                   rng.integers(-64, 65, DENSE_SIZE, dtype=np.int32),
+                   output_bias=0, output_scale=16)
+
+    def accumulator(self, b: chess.Board) -> Int16Array:
+        """Compute the accumulator of a position from all of its pieces."""
+        rows = self.feature_weights[board_features(b)]
+        accumulator: Int16Array = self.feature_bias + rows.sum(axis=0, dtype=np.int16)
+        return accumulator
+
+    def output(self, accumulator: Int16Array) -> int:
+        """Get the evaluation in centipawns, from white's point of view, from the accumulator."""
+        # np.clip costs several times more than np.maximum and np.minimum on arrays this small.
+        hidden = np.minimum(np.maximum(accumulator, 0), ACTIVATION_MAX)
+        dense = np.minimum(np.maximum((hidden @ self.dense_weights + self.dense_bias) >> HIDDEN_SHIFT, 0), ACTIVATION_MAX)
+        return (int(dense @ self.output_weights) + self.output_bias) // self.output_scale
+
+
+class NNUEEvaluator(eval.IncrementalEvaluator):
+    """
+    Evaluate positions with a `Network`, keeping its accumulator up to date as moves are made and unmade.
+
+    The Zobrist key, repetition history and evaluation cache of `eval.IncrementalEvaluator` are used as they are. Its
+    piece-square values and game phase are not followed, since the network doesn't read them. With `debug`, every
+    evaluation is checked against an accumulator computed from scratch.
+    """
+
+    def __init__(self, network: Network, debug: bool = False, pawn_hash_entries: int = eval.DEFAULT_PAWN_HASH_ENTRIES,
+                 eval_cache_entries: int = eval.DEFAULT_EVAL_CACHE_ENTRIES) -> None:
+        """:param network: The weights of the network."""
+        super().__init__(debug, pawn_hash_entries, eval_cache_entries)
+        self.network = network
+        self.accumulator = network.feature_bias.copy()
+        self.accumulators: list[Int16Array] = []
+
+    def reset(self, b: chess.Board) -> None:
+        """Start following the position `b`."""
+        super().reset(b)
+        self.accumulator = self.network.accumulator(b)
+        self.accumulators.clear()
+
+    def push(self, b: chess.Board, m: chess.Move) -> None:
+        """Play a move on `b` and update the accumulator and the key."""
+        self.accumulators.append(self.accumulator)
+        added, removed = move_features(b, m)
+        if added:
+            # Every move but a null move turns on one input and turns off another, so the first pair makes the new
+            # array and the rest (castling, captures) is added in place.
+            weights = self.network.feature_weights
+            accumulator = self.accumulator + weights[added[0]] - weights[removed[0]]
+            for index in added[1:]:
+                accumulator += weights[index]
+            for index in removed[1:]:
+                accumulator -= weights[index]
+            self.accumulator = accumulator
+        self.push_key(b, m, eval.move_keys(b, m))
+
+    def pop(self, b: chess.Board) -> chess.Move:
+        """Take back the last move played on `b` with `push`."""
+        self.accumulator = self.accumulators.pop()
+        return super().pop(b)
+
+    def evaluate(self, b: chess.Board) -> int:
+        """Get the network's evaluation of `b`, from white's point of view."""
+        cached = self.cache.probe(self.key)
+        if cached is not None and not self.debug:
+            return cached
+        score = self.network.output(self.accumulator)
+        self.cache.store(self.key, score)
+        if self.debug:
+            expected = self.network.output(self.network.accumulator(b))
+            if score != expected:
+                raise AssertionError(f"Incremental network output {score} != {expected} after {b.move_stack[-8:]} "
+                                     f"in {b.fen()}")
+        return score
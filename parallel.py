@@ -0,0 +1,398 @@
+"""Multi-process search for the homemade engine."""
+import logging
+import multiprocessing
+import os
+import queue
+import time
+from concurrent.futures import FIRST_EXCEPTION, Future, ProcessPoolExecutor, wait
+from multiprocessing.sharedctypes import Synchronized
+from multiprocessing.synchronize import Event
+import chess
+from chess.engine import Limit, PlayResult
+import eval
+from lib.engine_wrapper import allow_child_processes
+from lib.lichess_types import OPTIONS_GO_EGTB_TYPE
+from search import Searcher, SearchTimeoutError, allocate_time, search_depth, search_score, INFINITY
+from transposition import TranspositionTable
+
+logger = logging.getLogger(__name__)
+
+WORKER_STOP_TIMEOUT = 2  # Seconds to wait for the workers to stop after the main search is done.
+SearchTask = tuple[int, int, str, list[str], int, float | None, int, int | None]
+RootScore = tuple[str, int, bool]  # A root move in UCI notation, its score and whether the score is exact.
+RootMovesResult = tuple[list[RootScore] | None, list[str], int]
+
+
+def worker_count(requested: object, concurrency: object) -> int:
+    """
+    Get the number of processes a game can use without oversubscribing the cores.
+
+    :param requested: The `Threads` homemade option: the most processes one game may use.
+    :param concurrency: How many games lichess-bot plays at the same time (`challenge.concurrency`).
+    """
+    requested = int(requested) if isinstance(requested, (int, float, str)) else 1
+    concurrency = int(concurrency) if isinstance(concurrency, (int, float, str)) else 1
+    cores_per_game = (os.cpu_count() or 1) // max(1, concurrency)
+    return max(1, min(requested, cores_per_game))
+
+
+def encode_board(board: chess.Board) -> tuple[str, list[str]]:
+    """
+    Describe a position cheaply for another process.
+
+    Only the moves since the last capture or pawn move are needed to detect repetitions, so the board is sent as the
+    FEN before those moves plus the moves, instead of pickling the whole move stack.
+
+    :return: The FEN and the moves in UCI notation.
+    """
+    b = board.copy()
+    tail = min(b.halfmove_clock, len(b.move_stack))
+    moves = [b.pop().uci() for _ in range(tail)]
+    return b.fen(), moves[::-1]
+
+
+def decode_board(fen: str, moves: list[str]) -> chess.Board:
+    """Rebuild a board encoded by `encode_board`."""
+    board = chess.Board(fen)
+    for move in moves:
+        board.push_uci(move)
+    return board
+
+
+def lazy_smp_worker(worker_id: int, tasks: "multiprocessing.Queue[SearchTask | None]",
+                    results: "multiprocessing.Queue[tuple[object, ...]]", stop_event: Event, *,
+                    tt_name: str, hash_mb: float, options: OPTIONS_GO_EGTB_TYPE) -> None:
+    """
+    Search the positions sent by the main process until told to quit.
+
+    Every completed iteration is sent back as ("iteration", search id, worker id, depth, move, score, pv), and the end
+    of each search as ("done", search id, worker id, nodes).
+    """
+    tt = TranspositionTable.attach(tt_name, hash_mb)
+    searcher = Searcher.from_options(tt, options)
+    searcher.stop_event = stop_event
+    try:
+        while (task := tasks.get()) is not None:
+            search_id, generation, fen, moves, start_depth, deadline, max_depth, max_nodes = task
+            board = decode_board(fen, moves)
+            tt.generation = generation
+            searcher.new_search(new_generation=False)
+            searcher.max_nodes = max_nodes
+            hard = None if deadline is None else max(0.0, deadline - time.time())
+
+            def report(depth: int, move: chess.Move, score: int) -> None:
+                pv = [m.uci() for m in searcher.principal_variation(board, move, depth)]  # noqa: B023
+                results.put(("iteration", search_id, worker_id, depth, move.uci(), score, pv))  # noqa: B023
+
+            searcher.iterative_deepening(board, None, hard, max_depth, start_depth=start_depth, on_iteration=report)
+            results.put(("done", search_id, worker_id, searcher.nodes))
+    finally:
+        tt.close()
+
+
+class LazySMP:
+    """
+    Search the same position in several processes that share one transposition table.
+
+    The helper processes search the root like the main search, some of them one ply deeper, and fill the shared
+    table with results that the other searches pick up. When the main search is done, the result of the deepest
+    completed iteration of any process is played.
+    """
+
+    def __init__(self, workers: int, hash_mb: float, options: OPTIONS_GO_EGTB_TYPE) -> None:
+        """
+        Start the helper processes.
+
+        :param workers: The number of processes searching, including the main one.
+        :param hash_mb: The size of the shared transposition table in megabytes.
+        :param options: The engine's `homemade_options`.
+        """
+        self.tt = TranspositionTable.create_shared(hash_mb)
+        context = multiprocessing.get_context("spawn")
+        self.stop_event = context.Event()
+        self.results: multiprocessing.Queue[tuple[object, ...]] = context.Queue()
+        self.tasks: list[multiprocessing.Queue[SearchTask | None]] = [context.Queue() for _ in range(workers - 1)]
+        self.search_id = 0
+        shared_memory = self.tt.shared_memory
+        assert shared_memory is not None
+        with allow_child_processes():
+            self.processes = [context.Process(target=lazy_smp_worker,
+                                              args=(worker_id, tasks, self.results, self.stop_event),
+                                              kwargs={"tt_name": shared_memory.name, "hash_mb": hash_mb,
+                                                      "options": options},
+                                              daemon=True)
+                              for worker_id, tasks in enumerate(self.tasks)]
+            for process in self.processes:
+                process.start()
+
+    def search(self, searcher: Searcher, board: chess.Board, time_limit: Limit | None) -> PlayResult:
+        """
+        Search with the main searcher and all the helpers.
+
+        :param searcher: The main search. It must use `self.tt`.
+        :param board: The current position.
+        :param time_limit: The time control passed in by lichess-bot.
+        """
+        if not any(board.legal_moves):
+            return PlayResult(None, None)
+        start = time.perf_counter()
+        self.search_id += 1
+        searcher.new_search()
+        _, hard = allocate_time(board, time_limit)
+        deadline = None if hard is None else time.time() + hard
+        max_depth = search_depth(time_limit, hard)
+        max_nodes = time_limit.nodes if time_limit is not None else None
+        fen, moves = encode_board(board)
+        for worker_id, tasks in enumerate(self.tasks):
+            # Half of the helpers search one ply ahead of the main search.
+            start_depth = 1 + (worker_id + 1) % 2
+            tasks.put((self.search_id, self.tt.generation, fen, moves, start_depth, deadline, max_depth, max_nodes))
+
+        result = searcher.search_position(board, time_limit)
+        self.stop_event.set()
+        try:
+            return self.merge_results(searcher, board, result, time.perf_counter() - start)
+        finally:
+            self.stop_event.clear()
+
+    def merge_results(self, searcher: Searcher, board: chess.Board, result: PlayResult, elapsed: float) -> PlayResult:
+        """Wait for the helpers to stop and return the deepest completed result of all the searches."""
+        info = result.info
+        best_depth = info.get("depth", 0)
+        best: tuple[chess.Move, int, list[chess.Move] | None] | None = None
+        nodes = info.get("nodes", 0)
+        running = len(self.processes)
+        give_up = time.perf_counter() + WORKER_STOP_TIMEOUT
+        while running:
+            try:
+                message = self.results.get(timeout=max(0.0, give_up - time.perf_counter()))
+            except queue.Empty:
+                logger.warning(f"{running} search processes did not stop in time.")
+                break
+            if message[1] != self.search_id:
+                continue
+            if message[0] == "done":
+                running -= 1
+                nodes += int(str(message[3]))
+                continue
+            _, _, _, depth, move, score, pv = message
+            if int(str(depth)) > best_depth:
+                best_depth = int(str(depth))
+                best = (chess.Move.from_uci(str(move)), int(str(score)),
+                        [chess.Move.from_uci(m) for m in pv] if isinstance(pv, list) else None)
+
+        if best is None:
+            move, score = result.move, search_score(info["score"].relative) if "score" in info else 0
+            assert move is not None
+            return searcher.play_result(board, move, score, info.get("depth", 0), elapsed,
+                                        nodes=nodes, pv=info.get("pv"))
+        move, score, pv = best
+        return searcher.play_result(board, move, score, best_depth, elapsed, nodes=nodes, pv=pv)
+
+    def close(self) -> None:
+        """Stop the helper processes and free the shared transposition table."""
+        self.stop_event.set()
+        for tasks in self.tasks:
+            tasks.put(None)
+        for process in self.processes:
+            process.join(timeout=WORKER_STOP_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+        self.tt.close()
+
+
+def root_score_key(root_score: RootScore) -> tuple[int, bool]:
+    """Sort root moves by score, and exact scores ahead of upper bounds that are just as high."""
+    _, score, exact = root_score
+    return score, exact
+
+
+class RootSplitWorker:
+    """The state kept by each process of a `RootSplit` pool between the tasks it is given."""
+
+    def __init__(self, alpha: "Synchronized[int]", stop_event: Event, hash_mb: float,
+                 options: OPTIONS_GO_EGTB_TYPE) -> None:
+        """
+        Create the search of this process.
+
+        :param alpha: The best score found so far by any process in the current iteration.
+        :param stop_event: Set by the main process when the search has to stop.
+        :param hash_mb: The size of the transposition table of this process in megabytes.
+        :param options: The engine's `homemade_options`.
+        """
+        self.alpha = alpha
+        self.searcher = Searcher.from_options(TranspositionTable(hash_mb), options)
+        self.searcher.stop_event = stop_event
+        self.search_id = 0
+
+
+root_split_worker: RootSplitWorker | None = None
+
+
+def init_root_split_worker(alpha: "Synchronized[int]", stop_event: Event, hash_mb: float,
+                           options: OPTIONS_GO_EGTB_TYPE) -> None:
+    """Set up a process of a `RootSplit` pool. The arguments are those of `RootSplitWorker`."""
+    global root_split_worker
+    root_split_worker = RootSplitWorker(alpha, stop_event, hash_mb, options)
+
+
+def search_root_moves(search_id: int, fen: str, moves: list[str], root_moves: list[str], *, depth: int,
+                      deadline: float | None) -> RootMovesResult:
+    """
+    Search some of the root moves in a process of a `RootSplit` pool.
+
+    The best score found by any process is shared as alpha, so a move only needs to be searched with the full window
+    if it can beat the best move of the whole root, not just the best move of this process.
+
+    :param search_id: Identifies the move being searched. The transposition table and the move ordering tables are
+        kept between the iterations of a search and reset for a new search.
+    :param fen: The position before `moves`, from `encode_board`.
+    :param moves: The moves since the last capture or pawn move, from `encode_board`.
+    :param root_moves: The root moves to search, in UCI notation, best first.
+    :param depth: The depth of the iteration.
+    :param deadline: The time (from `time.time()`) at which the search is aborted.
+    :return: The score of each move and whether it is exact (None if the search was aborted), the principal
+        variation of the best move, and the number of nodes searched.
+    """
+    worker = root_split_worker
+    assert worker is not None
+    searcher = worker.searcher
+    if search_id != worker.search_id:
+        searcher.new_search()
+        worker.search_id = search_id
+    searcher.nodes = 0
+    searcher.deadline = None if deadline is None else time.perf_counter() + max(0.0, deadline - time.time())
+    board = decode_board(fen, moves)
+    searcher.evaluator.reset(board)
+    scores: list[RootScore] = []
+    try:
+        for move_number, uci in enumerate(root_moves):
+            alpha = worker.alpha.value
+            searcher.evaluator.push(board, chess.Move.from_uci(uci))
+            try:
+                score = searcher.principal_variation_search(board, depth - 1, 1, alpha, INFINITY,
+                                                            first_move=move_number == 0)
+            finally:
+                searcher.evaluator.pop(board)
+            # A move that can't beat alpha only gets an upper bound, which may tie with the exact score of the best.
+            scores.append((uci, score, score > alpha))
+            with worker.alpha.get_lock():
+                worker.alpha.value = max(worker.alpha.value, score)
+    except SearchTimeoutError:
+        return None, [], searcher.nodes
+
+    best_uci, _, _ = max(scores, key=root_score_key)
+    pv = [m.uci() for m in searcher.principal_variation(board, chess.Move.from_uci(best_uci), depth)]
+    return scores, pv, searcher.nodes
+
+
+class RootSplit:
+    """
+    Split the root moves between the processes of a persistent pool.
+
+    Each iteration of the iterative deepening hands every process a share of the root moves. The processes tell each
+    other the best score found so far, so that they can cut off moves that can't beat it, and the main process picks
+    the best of their results and uses the scores to order the root moves of the next iteration.
+    """
+
+    def __init__(self, workers: int, hash_mb: float, options: OPTIONS_GO_EGTB_TYPE) -> None:
+        """
+        Start the pool.
+
+        :param workers: The number of processes searching.
+        :param hash_mb: The size of the transposition table of each process in megabytes.
+        :param options: The engine's `homemade_options`.
+        """
+        context = multiprocessing.get_context("spawn")
+        self.workers = workers
+        self.alpha: Synchronized[int] = context.Value("q", -INFINITY)
+        self.stop_event = context.Event()
+        self.search_id = 0
+        with allow_child_processes():
+            self.executor = ProcessPoolExecutor(workers, mp_context=context, initializer=init_root_split_worker,
+                                                initargs=(self.alpha, self.stop_event, hash_mb, options))
+            # The processes are only started when tasks are submitted, so start them now instead of during a game.
+            wait([self.executor.submit(int) for _ in range(workers)])
+
+    def search(self, searcher: Searcher, board: chess.Board, time_limit: Limit | None) -> PlayResult:
+        """
+        Search with iterative deepening, splitting each iteration between the processes of the pool.
+
+        :param searcher: Orders the root moves of the first iteration and packages the result.
+        :param board: The current position.
+        :param time_limit: The time control passed in by lichess-bot.
+        """
+        if not any(board.legal_moves):
+            return PlayResult(None, None)
+        start = time.perf_counter()
+        self.search_id += 1
+        searcher.new_search()
+        soft, hard = allocate_time(board, time_limit)
+        deadline = None if hard is None else time.time() + hard
+        max_depth = search_depth(time_limit, hard)
+        fen, moves = encode_board(board)
+        root_scores = searcher.static_move_scores(board, list(board.legal_moves))
+        root_moves = [m.uci() for m in searcher.orderer.order(board, None, 0, root_scores)]
+        best_move, best_score, best_pv, completed_depth, nodes = chess.Move.from_uci(root_moves[0]), 0, None, 0, 0
+        for depth in range(1, max_depth + 1):
+            scores, pv, iteration_nodes = self.search_iteration(fen, moves, root_moves, depth, deadline)
+            nodes += iteration_nodes
+            if scores is None:
+                break
+            # Sorting is stable, so the best move of the last iteration stays ahead of moves with the same bound.
+            scores.sort(key=root_score_key, reverse=True)
+            root_moves = [uci for uci, _, _ in scores]
+            best_move, best_score, completed_depth = chess.Move.from_uci(scores[0][0]), scores[0][1], depth
+            best_pv = [chess.Move.from_uci(uci) for uci in pv]
+            elapsed = time.perf_counter() - start
+            if len(root_moves) == 1 or abs(best_score) >= eval.MATE_THRESHOLD or (soft is not None and elapsed >= soft):
+                break
+            # The processes don't count nodes together, so a node limit is only checked between iterations.
+            if time_limit is not None and time_limit.nodes and nodes >= time_limit.nodes:
+                break
+        return searcher.play_result(board, best_move, best_score, completed_depth, time.perf_counter() - start,
+                                    nodes=nodes, pv=best_pv)
+
+    def search_iteration(self, fen: str, moves: list[str], root_moves: list[str], depth: int,
+                         deadline: float | None) -> RootMovesResult:
+        """
+        Search all the root moves to `depth`.
+
+        The moves are dealt out in turn, so every process gets some of the most promising moves.
+
+        :return: The score of each root move in the order of `root_moves` (None if the search was aborted), the
+            principal variation of the best move and the number of nodes searched.
+        """
+        self.alpha.value = -INFINITY
+        shares = [root_moves[worker::self.workers] for worker in range(self.workers)]
+        futures: list[Future[RootMovesResult]] = [
+            self.executor.submit(search_root_moves, self.search_id, fen, moves, share, depth=depth, deadline=deadline)
+            for share in shares if share]
+        timeout = None if deadline is None else max(0.0, deadline - time.time())
+        _, running = wait(futures, timeout=timeout, return_when=FIRST_EXCEPTION)
+        if running:
+            self.stop_event.set()
+            wait(futures)
+            self.stop_event.clear()
+
+        results = [future.result() for future in futures]
+        nodes = sum(result_nodes for _, _, result_nodes in results)
+        if any(scores is None for scores, _, _ in results):
+            return None, [], nodes
+        best: tuple[int, bool] = (-INFINITY, False)
+        best_pv: list[str] = []
+        all_scores: list[RootScore] = []
+        for scores, pv, _ in results:
+            assert scores is not None
+            all_scores.extend(scores)
+            share_best = max(map(root_score_key, scores))
+            if share_best > best:
+                best, best_pv = share_best, pv
+        order = {uci: index for index, uci in enumerate(root_moves)}
+        all_scores.sort(key=lambda move_score: order[move_score[0]])
+        return all_scores, best_pv, nodes
+
+    def close(self) -> None:
+        """Stop the pool."""
+        self.stop_event.set()
+        self.executor.shutdown(wait=True, cancel_futures=True)
@@ -72,3 +72,55 @@ kingTable = [
     -30, -40, -40, -50, -50, -40, -40, -30,
     -30, -40, -40, -50, -50, -40, -40, -30,
     -30, -40, -40, -50, -50, -40, -40, -30]
+
+
+# Endgame tables, used more and more as the pieces come off the board. The other pieces use the same table in both
+# phases.
+
+# Pawn in the endgame: the closer to promotion, the better.
+pawnEndgameTable = [
+    0, 0, 0, 0, 0, 0, 0, 0,
+    0, 0, 0, 0, 0, 0, 0, 0,
+    5, 5, 5, 5, 5, 5, 5, 5,
+    10, 10, 10, 10, 10, 10, 10, 10,
+    20, 20, 20, 20, 20, 20, 20, 20,
+    35, 35, 35, 35, 35, 35, 35, 35,
+    60, 60, 60, 60, 60, 60, 60, 60,
+    0, 0, 0, 0, 0, 0, 0, 0]
+
+
+# King in the endgame: come out to the center.
+kingEndgameTable = [
+    -50, -30, -30, -30, -30, -30, -30, -50,
+    -30, -30, 0, 0, 0, 0, -30, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -20, -10, 0, 0, -10, -20, -30,
+    -50, -40, -30, -20, -20, -30, -40, -50]
+
+knightEndgameTable = knightTable
+bishopEndgameTable = bishopTable
+rookEndgameTable = rookTable
+queenEndgameTable = queenTable
+
+
+# The tables of each piece type, indexed like python-chess piece types (PAWN = 1, ..., KING = 6).
+MIDGAME_TABLES: tuple[list[int], ...] = ([], pawnTable, knightTable, bishopTable, rookTable, queenTable, kingTable)
+ENDGAME_TABLES: tuple[list[int], ...] = ([], pawnEndgameTable, knightEndgameTable, bishopEndgameTable,
+                                         rookEndgameTable, queenEndgameTable, kingEndgameTable)
+
+SignedTables = tuple[tuple[tuple[int, ...], ...], ...]
+
+
+def signed_tables(tables: tuple[list[int], ...], values: dict[int, int]) -> SignedTables:
+    """
+    Precompute the material plus table value of each piece on each square: [color][piece_type][square].
+
+    The tables above are written for white with a1 first, so black's are mirrored. Values are signed from white's
+    point of view, and colors are indexed like python-chess colors (BLACK = 0, WHITE = 1).
+    """
+    return tuple(tuple(tuple(sign * (values[piece_type] + table[square ^ mirror]) for square in range(len(table)))
+                       for piece_type, table in enumerate(tables))
+                 for sign, mirror in ((-1, 56), (1, 0)))
@@ -0,0 +1,626 @@
+"""Iterative deepening principal variation search used by the homemade engine."""
+import time
+from collections.abc import Callable
+from multiprocessing.synchronize import Event
+import chess
+import chess.polyglot
+from chess.engine import Limit, PlayResult, PovScore, Score, Cp, Mate, InfoDict
+import eval
+import nnue
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+from move_ordering import MoveOrderer
+from selectivity import Selectivity, is_enabled
+from lib.lichess_types import OPTIONS_GO_EGTB_TYPE
+
+INFINITY = 10**12
+MAX_DEPTH = 64
+DEFAULT_DEPTH = 4  # Used when nothing else limits the search, e.g. when the engine is called outside of lichess-bot.
+CHECK_TIME_EVERY = 64  # Nodes between two looks at the clock.
+MOVES_TO_GO = 30  # Assumed number of moves left in the game when the clock has no moves-to-go information.
+DELTA_MARGIN = 200  # A capture is skipped in quiescence if even winning this much on top of the victim can't reach alpha.
+ASPIRATION_WINDOW = 50  # Half-width of the first root window around the previous iteration's score.
+ASPIRATION_MIN_DEPTH = 3  # Shallower iterations are too unstable for a narrow window to pay off.
+
+
+class SearchTimeoutError(Exception):
+    """Raised inside the search when the deadline or the node limit is reached."""
+
+
+def allocate_time(board: chess.Board, time_limit: Limit | None) -> tuple[float | None, float | None]:
+    """
+    Get the time to spend on this move.
+
+    :param board: The current position.
+    :param time_limit: The limit passed to the engine by `engine_wrapper.move_time`.
+    :return: The soft limit, after which no new iteration is started, and the hard limit, after which the search is
+        aborted, both in seconds. (None, None) if there is no time limit.
+    """
+    if time_limit is None:
+        return None, None
+    if isinstance(time_limit.time, (int, float)):
+        # First move, correspondence games and the `movetime` go command give a fixed time per move.
+        hard = max(0.01, time_limit.time * 0.95)
+        return hard / 2, hard
+    clock = time_limit.white_clock if board.turn == chess.WHITE else time_limit.black_clock
+    increment = time_limit.white_inc if board.turn == chess.WHITE else time_limit.black_inc
+    if not isinstance(clock, (int, float)):
+        return None, None
+    increment = increment if isinstance(increment, (int, float)) else 0
+    moves_to_go = time_limit.remaining_moves or MOVES_TO_GO
+    soft = clock / moves_to_go + increment * 3 / 4
+    hard = max(0.01, min(soft * 3, clock / 4))
+    return min(soft, hard), hard
+
+
+def search_depth(time_limit: Limit | None, hard: float | None) -> int:
+    """
+    Get the depth of the last iteration of a search.
+
+    :param time_limit: The limit passed in by lichess-bot.
+    :param hard: The hard time limit given by `allocate_time`.
+    :return: The depth of the limit if it has one. Else `MAX_DEPTH` if the clock or a node limit stops the search, and
+        `DEFAULT_DEPTH` if nothing does.
+    """
+    if time_limit is not None and time_limit.depth:
+        return min(time_limit.depth, MAX_DEPTH)
+    if hard is not None or (time_limit is not None and time_limit.nodes):
+        return MAX_DEPTH
+    return DEFAULT_DEPTH
+
+
+def score_to_tt(score: int, ply: int) -> int:
+    """Turn a mate score from a position `ply` plies from the root into the distance from that position, to store it."""
+    if score >= eval.MATE_THRESHOLD:
+        return score + ply
+    if score <= -eval.MATE_THRESHOLD:
+        return score - ply
+    return score
+
+
+def score_from_tt(score: int, ply: int) -> int:
+    """Turn a stored mate score back into the distance from the root, for a position `ply` plies from it."""
+    if score >= eval.MATE_THRESHOLD:
+        return score - ply
+    if score <= -eval.MATE_THRESHOLD:
+        return score + ply
+    return score
+
+
+def engine_score(score: int) -> Score:
+    """
+    Convert a search score into a score for lichess-bot.
+
+    Scores past `eval.MATE_THRESHOLD` are mates in whole moves: the side to move mates on an odd ply from the root, and
+    is mated on an even one.
+    """
+    if score >= eval.MATE_THRESHOLD:
+        return Mate((eval.MATE_SCORE - score + 1) // 2)
+    if score <= -eval.MATE_THRESHOLD:
+        return Mate(-((eval.MATE_SCORE + score) // 2))
+    return Cp(score)
+
+
+def search_score(score: Score) -> int:
+    """Convert a score made by `engine_score` back into a search score."""
+    mate = score.mate()
+    if mate is None:
+        return score.score() or 0
+    return eval.MATE_SCORE - (2 * mate - 1) if mate > 0 else -(eval.MATE_SCORE + 2 * mate)
+
+
+class Searcher:
+    """
+    A negamax principal variation search with a transposition table and move ordering, driven by iterative deepening.
+
+    Scores are in centipawns from the point of view of the side to move.
+    """
+
+    def __init__(self, tt: TranspositionTable, selectivity: Selectivity | None = None,
+                 evaluator: eval.IncrementalEvaluator | None = None) -> None:
+        """
+        Set up the search.
+
+        :param tt: The transposition table shared by all the searches of this engine.
+        :param selectivity: The pruning, reduction and extension techniques to use. All are used by default.
+        :param evaluator: Evaluates the positions, updated as moves are made and unmade.
+        """
+        self.tt = tt
+        self.selectivity = selectivity or Selectivity()
+        self.evaluator = evaluator or eval.IncrementalEvaluator()
+        self.orderer = MoveOrderer()
+        self.nodes = 0
+        self.aspiration_researches = 0
+        self.max_nodes: int | None = None
+        self.deadline: float | None = None
+        self.stop_event: Event | None = None
+        self.predicted_pv: list[chess.Move] = []  # The principal variation of the last search.
+        self.expected_reply = False
+        self.root_scores: dict[chess.Move, int] = {}  # The static evaluation after each root move.
+        self.reset_reuse_stats()
+
+    @classmethod
+    def from_options(cls, tt: TranspositionTable, options: OPTIONS_GO_EGTB_TYPE) -> "Searcher":
+        """
+        Set up the search described by the engine's `homemade_options`.
+
+        Besides the selectivity options, `EvalDebug: true` checks every incremental evaluation against a full one,
+        `PawnHash` and `EvalCache` set the number of entries of the pawn hash table and of the evaluation cache, and
+        `NNUEWeights` is the path of a network (see `nnue.py`) to evaluate with instead of `eval.py`.
+        """
+        pawn_hash_option = options.get("PawnHash", eval.DEFAULT_PAWN_HASH_ENTRIES)
+        pawn_hash_entries = (int(pawn_hash_option) if isinstance(pawn_hash_option, (int, float, str))
+                             else eval.DEFAULT_PAWN_HASH_ENTRIES)
+        eval_cache_option = options.get("EvalCache", eval.DEFAULT_EVAL_CACHE_ENTRIES)
+        eval_cache_entries = (int(eval_cache_option) if isinstance(eval_cache_option, (int, float, str))
+                              else eval.DEFAULT_EVAL_CACHE_ENTRIES)
+        debug = is_enabled(options.get("EvalDebug", False))
+        weights = options.get("NNUEWeights")
+        evaluator = (nnue.NNUEEvaluator(nnue.Network.load(weights), debug, pawn_hash_entries, eval_cache_entries)
+                     if isinstance(weights, str) and weights
+                     else eval.IncrementalEvaluator(debug, pawn_hash_entries, eval_cache_entries))
+        return cls(tt, Selectivity(options), evaluator)
+
+    def reset_reuse_stats(self) -> None:
+        """Reset the counters used to estimate the work saved by the entries kept from earlier searches."""
+        # By remaining depth: the nodes searched below fully searched nodes, the number of such nodes, and the number
+        # of cutoffs by entries stored by an earlier search.
+        self.subtree_nodes = [0] * (MAX_DEPTH + 1)
+        self.subtree_counts = [0] * (MAX_DEPTH + 1)
+        self.reused_cutoffs = [0] * (MAX_DEPTH + 1)
+
+    def saved_nodes(self) -> int:
+        """
+        Estimate how many nodes the cutoffs by entries of earlier searches saved.
+
+        Each cutoff is counted as the average size of the subtrees fully searched at the same depth in this search, or
+        at the deepest shallower depth if there was none.
+        """
+        saved = 0
+        average = 0.0
+        for nodes, count, cutoffs in zip(self.subtree_nodes, self.subtree_counts, self.reused_cutoffs, strict=True):
+            if count:
+                average = nodes / count
+            saved += int(cutoffs * average)
+        return saved
+
+    def stats(self) -> list[str]:
+        """Get human-readable summaries of the counters of the last search."""
+        return [self.tt.stats(),
+                self.evaluator.pawn_table.stats(),
+                self.evaluator.cache.stats(),
+                self.orderer.stats(),
+                self.selectivity.stats(),
+                f"Search: {self.aspiration_researches} aspiration re-searches",
+                (f"Reuse: {'expected' if self.expected_reply else 'unexpected'} reply, {sum(self.reused_cutoffs)} "
+                 f"cutoffs by entries of earlier moves saved about {self.saved_nodes()} nodes")]
+
+    def check_limits(self) -> None:
+        """Abort the search if the hard time limit or the node limit has been reached, or if it was told to stop."""
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            raise SearchTimeoutError
+        if self.nodes % CHECK_TIME_EVERY == 0 and ((self.deadline is not None and time.perf_counter() >= self.deadline)
+                                                   or (self.stop_event is not None and self.stop_event.is_set())):
+            raise SearchTimeoutError
+
+    def new_search(self, new_generation: bool = True) -> None:
+        """
+        Get ready for the next move of the game.
+
+        The transposition table, killer moves and history scores are aged instead of cleared, so most of the work of
+        the previous search is reused, and the counters are reset.
+
+        :param new_generation: Whether to start a new generation of the transposition table. Helper processes sharing
+            the table of the main search leave that to the main search.
+        """
+        self.nodes = 0
+        self.aspiration_researches = 0
+        if new_generation:
+            self.tt.new_generation()
+        else:
+            self.tt.reset_stats()
+        self.orderer.age()
+        self.orderer.reset_stats()
+        self.selectivity.reset_stats()
+        self.evaluator.pawn_table.reset_stats()
+        self.evaluator.cache.reset_stats()
+        self.reset_reuse_stats()
+
+    def search(self, board: chess.Board, time_limit: Limit | None) -> PlayResult:
+        """
+        Search until the time runs out and return the best move of the deepest completed iteration.
+
+        :param board: The current position. It is not modified.
+        :param time_limit: The time control passed in by lichess-bot.
+        :return: The move, with depth, nodes, nps, time, score and pv in `info`.
+        """
+        self.new_search()
+        return self.search_position(board, time_limit)
+
+    def search_position(self, board: chess.Board, time_limit: Limit | None) -> PlayResult:
+        """Search like `search`, but without resetting the state left by the previous search."""
+        start = time.perf_counter()
+        soft, hard = allocate_time(board, time_limit)
+        max_depth = search_depth(time_limit, hard)
+        self.max_nodes = time_limit.nodes if time_limit is not None else None
+        best_move, best_score, completed_depth = self.iterative_deepening(board, soft, hard, max_depth)
+        if best_move is None:
+            return PlayResult(None, None)
+        return self.play_result(board, best_move, best_score, completed_depth, time.perf_counter() - start)
+
+    def iterative_deepening(self, board: chess.Board, soft: float | None, hard: float | None, max_depth: int,
+                            *, start_depth: int = 1,
+                            on_iteration: Callable[[int, chess.Move, int], None] | None = None
+                            ) -> tuple[chess.Move | None, int, int]:
+        """
+        Search one ply deeper at a time, until the soft time limit is passed or the hard one is reached.
+
+        :param board: The current position. It is not modified.
+        :param soft: The time in seconds after which no new iteration is started (None for no limit).
+        :param hard: The time in seconds after which the search is aborted (None for no limit).
+        :param max_depth: The depth of the last iteration.
+        :param start_depth: The depth of the first iteration.
+        :param on_iteration: Called with the depth, best move and score after each completed iteration.
+        :return: The best move (None if there are no legal moves), its score and the depth of the last completed
+            iteration (0 if none completed).
+        """
+        start = time.perf_counter()
+        self.deadline = start + hard if hard is not None else None
+        b = board.copy()
+        self.evaluator.reset(b)
+        legal = list(b.legal_moves)
+        if not legal:
+            return None, 0, 0
+        self.root_scores = self.static_move_scores(b, legal)
+        best_move = self.expected_move(b) or max(legal, key=self.root_scores.__getitem__)
+        best_score = 0
+        completed_depth = 0
+        for depth in range(start_depth, max_depth + 1):
+            try:
+                move, score = self.aspiration_search(b, depth, best_move, best_score)
+            except SearchTimeoutError:
+                break
+            best_move, best_score, completed_depth = move, score, depth
+            if on_iteration is not None:
+                on_iteration(depth, move, score)
+            elapsed = time.perf_counter() - start
+            if len(legal) == 1 or abs(score) >= eval.MATE_THRESHOLD or (soft is not None and elapsed >= soft):
+                break
+        return best_move, best_score, completed_depth
+
+    def static_move_scores(self, b: chess.Board, moves: list[chess.Move]) -> dict[chess.Move, int]:
+        """
+        Get the static evaluation after each move, from the point of view of the side that plays it.
+
+        The positions are evaluated in one batch (see `eval.evaluate_batch`).
+        """
+        bitboards = []
+        for m in moves:
+            b.push(m)
+            bitboards.append(eval.board_bitboards(b))
+            b.pop()
+        sign = 1 if b.turn == chess.WHITE else -1
+        return {m: sign * int(score) for m, score in zip(moves, eval.evaluate_bitboards(bitboards), strict=True)}
+
+    def expected_move(self, board: chess.Board) -> chess.Move | None:
+        """
+        Get the move that earlier searches expect to be best, to search it first.
+
+        If the opponent played the reply predicted by the last search, this is the next move of its principal
+        variation. Otherwise, it is the move stored in the transposition table, if any.
+        """
+        pv = self.predicted_pv
+        self.expected_reply = len(pv) > 2 and board.move_stack[-2:] == pv[:2]
+        if self.expected_reply and board.is_legal(pv[2]):
+            return pv[2]
+        entry = self.tt.probe(chess.polyglot.zobrist_hash(board))
+        if entry is not None and entry[3] is not None and board.is_legal(entry[3]):
+            return entry[3]
+        return None
+
+    def play_result(self, board: chess.Board, move: chess.Move, score: int, depth: int, elapsed: float,
+                    *, nodes: int | None = None, pv: list[chess.Move] | None = None) -> PlayResult:
+        """
+        Package a search result for lichess-bot.
+
+        :param nodes: The number of nodes searched, if not only by this searcher.
+        :param pv: The principal variation, if it is not to be read from the transposition table.
+        """
+        nodes = self.nodes if nodes is None else nodes
+        pv = pv or self.principal_variation(board, move, max(1, depth))
+        self.predicted_pv = pv
+        info: InfoDict = {"depth": depth,
+                          "nodes": nodes,
+                          "nps": int(nodes / elapsed) if elapsed > 0 else 0,
+                          "time": elapsed,
+                          "score": PovScore(engine_score(score), board.turn),
+                          "pv": pv,
+                          "hashfull": self.tt.hashfull()}
+        return PlayResult(move, pv[1] if len(pv) > 1 else None, info)
+
+    def aspiration_search(self, b: chess.Board, depth: int, previous_best: chess.Move,
+                          previous_score: int) -> tuple[chess.Move, int]:
+        """
+        Search the root with a narrow window around the previous iteration's score.
+
+        The window is widened on the failing side and the root searched again until the score falls inside it.
+
+        :return: The best move and its score.
+        """
+        if depth < ASPIRATION_MIN_DEPTH or abs(previous_score) >= eval.MATE_THRESHOLD:
+            return self.search_root(b, depth, previous_best, -INFINITY, INFINITY)
+
+        delta = ASPIRATION_WINDOW
+        alpha, beta = previous_score - delta, previous_score + delta
+        while True:
+            move, score = self.search_root(b, depth, previous_best, alpha, beta)
+            if score <= alpha:
+                alpha = max(-INFINITY, score - delta)
+            elif score >= beta:
+                beta = min(INFINITY, score + delta)
+                previous_best = move
+            else:
+                return move, score
+            self.aspiration_researches += 1
+            delta *= 4
+
+    def search_root(self, b: chess.Board, depth: int, previous_best: chess.Move, alpha: int,
+                    beta: int) -> tuple[chess.Move, int]:
+        """
+        Search all root moves to `depth`, starting with the best move of the previous iteration.
+
+        Quiet root moves are ordered by their static evaluation, scored in one batch at the start of the search.
+
+        Alpha is raised as better root moves are found, so moves after the first one are searched with a null window
+        and only searched again with the full window if they beat the best move so far.
+
+        :return: The best move and its score. If the score is outside the window, it is only a bound.
+        """
+        alpha_orig = alpha
+        best_move = previous_best
+        best_score = -INFINITY
+        for move_number, m in enumerate(self.orderer.order(b, previous_best, 0, self.root_scores)):
+            self.evaluator.push(b, m)
+            try:
+                score = self.principal_variation_search(b, depth - 1, 1, alpha, beta, first_move=move_number == 0)
+            finally:
+                self.evaluator.pop(b)
+            if score > best_score:
+                best_score, best_move = score, m
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                break
+        bound = UPPER if best_score <= alpha_orig else LOWER if best_score >= beta else EXACT
+        self.tt.store(chess.polyglot.zobrist_hash(b), depth, bound, best_score, best_move)
+        return best_move, best_score
+
+    def principal_variation_search(self, b: chess.Board, depth: int, ply: int, alpha: int, beta: int, *,
+                                   first_move: bool, reduction: int = 0) -> int:
+        """
+        Get the score of the move just played, from the point of view of the side that played it.
+
+        The first move of a node is searched with the full window. Later moves are expected to be worse, so they are
+        searched with a null window that can only prove it, and searched again with the full window if it fails.
+        Reduced moves are first searched shallower, and searched again at full depth if they beat alpha.
+        """
+        if first_move:
+            return -self.negamax(b, depth, ply, -beta, -alpha)
+        score = -self.negamax(b, depth - reduction, ply, -alpha - 1, -alpha)
+        if reduction and score > alpha:
+            self.selectivity.reduction_researches += 1
+            score = -self.negamax(b, depth, ply, -alpha - 1, -alpha)
+        if alpha < score < beta:
+            score = -self.negamax(b, depth, ply, -beta, -alpha)
+        return score
+
+    def negamax(self, b: chess.Board, depth: int, ply: int, alpha: int, beta: int) -> int:
+        """
+        Get the score of a position using alpha-beta pruning.
+
+        :param depth: The remaining depth to search before the quiescence search.
+        :param ply: The distance from the root.
+        """
+        start_nodes = self.nodes
+        self.nodes += 1
+        self.check_limits()
+        in_check = b.is_check()
+        depth += self.selectivity.extension(in_check, ply)
+        leaf_score = self.leaf_score(b, depth, ply, alpha, beta, in_check=in_check)
+        if leaf_score is not None:
+            return leaf_score
+
+        key = self.evaluator.key
+        cutoff, alpha, beta, tt_move = self.probe_tt(key, depth, ply, alpha, beta)
+        if cutoff is not None:
+            return cutoff
+        alpha_orig = alpha
+
+        static_eval = None
+        if not in_check and beta - alpha == 1:
+            cutoff, static_eval = self.try_pruning(b, depth, ply, alpha, beta)
+            if cutoff is not None:
+                return cutoff
+        futile = static_eval is not None and self.selectivity.is_futile(depth, static_eval, alpha)
+
+        moves = self.orderer.order(b, tt_move, ply)
+        if not moves:
+            return -(eval.MATE_SCORE - ply) if in_check else 0
+
+        best = -INFINITY
+        best_move = None
+        for move_number, m in enumerate(moves):
+            reduction = self.quiet_move_reduction(b, m, depth, move_number, in_check=in_check, futile=futile)
+            if reduction is None:
+                continue
+            self.evaluator.push(b, m)
+            try:
+                score = self.principal_variation_search(b, depth - 1, ply + 1, alpha, beta,
+                                                        first_move=move_number == 0, reduction=reduction)
+            finally:
+                self.evaluator.pop(b)
+            if score > best:
+                best, best_move = score, m
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                self.orderer.record_cutoff(b, m, depth, ply, move_number)
+                break
+
+        bound = UPPER if best <= alpha_orig else LOWER if best >= beta else EXACT
+        self.tt.store(key, depth, bound, score_to_tt(best, ply), best_move)
+        self.subtree_nodes[min(depth, MAX_DEPTH)] += self.nodes - start_nodes
+        self.subtree_counts[min(depth, MAX_DEPTH)] += 1
+        return best
+
+    def leaf_score(self, b: chess.Board, depth: int, ply: int, alpha: int, beta: int, *, in_check: bool) -> int | None:
+        """
+        Score a node of `negamax` without searching its moves, if it is a draw or at the horizon.
+
+        :return: 0 for a draw, the score of the quiescence search (or of the mate `ply` plies from the root) at the
+            horizon, else None.
+        """
+        if self.is_draw(b, in_check=in_check):
+            return 0
+        if depth > 0:
+            return None
+        if in_check and not any(b.generate_legal_moves()):
+            return -(eval.MATE_SCORE - ply)
+        return self.quiescence(b, alpha, beta)
+
+    def is_draw(self, b: chess.Board, *, in_check: bool) -> bool:
+        """
+        Whether a position in the search is a draw by repetition, the fifty-move rule or insufficient material.
+
+        A single repetition already counts: if repeating is good for one side, it can repeat again.
+        Stalemate is found by the move generation of `negamax`.
+        """
+        if b.halfmove_clock >= 4 and self.evaluator.is_repetition(b):
+            return True
+        if b.halfmove_clock >= 100 and (not in_check or any(b.generate_legal_moves())):
+            return True
+        return not (b.pawns | b.rooks | b.queens) and b.is_insufficient_material()
+
+    def try_pruning(self, b: chess.Board, depth: int, ply: int, alpha: int, beta: int) -> tuple[int | None, int]:
+        """
+        Try to show that a node outside the principal variation is not worth a full search.
+
+        In order: reverse futility pruning, razoring into the quiescence search, and null-move pruning.
+
+        :return: The score to return if the node can be pruned (else None), and the static evaluation.
+        """
+        sel = self.selectivity
+        static_eval = self.evaluate(b)
+        if sel.can_reverse_futility_prune(depth, static_eval, beta):
+            sel.reverse_futility_prunes += 1
+            return static_eval, static_eval
+        if sel.can_razor(depth, static_eval, alpha):
+            score = self.quiescence(b, alpha, alpha + 1)
+            if score <= alpha:
+                sel.razor_prunes += 1
+                return score, static_eval
+        if sel.can_null_move(b, depth, static_eval, beta):
+            self.evaluator.push(b, chess.Move.null())
+            try:
+                score = -self.negamax(b, depth - 1 - sel.null_move_reduction(depth), ply + 1, -beta, -beta + 1)
+            finally:
+                self.evaluator.pop(b)
+            if score >= beta:
+                sel.null_move_cutoffs += 1
+                # A mate found after passing is not a real mate.
+                return (beta if score >= eval.MATE_THRESHOLD else score), static_eval
+        return None, static_eval
+
+    def quiet_move_reduction(self, b: chess.Board, m: chess.Move, depth: int, move_number: int, *, in_check: bool,
+                             futile: bool) -> int | None:
+        """
+        Decide how to search a move: prune it (None), reduce it, or search it at full depth (0).
+
+        Only quiet moves that don't give check, and are not the first move of the node, can be pruned or reduced.
+        """
+        if (move_number == 0 or in_check or b.is_capture(m) or m.promotion
+                or (not futile and self.selectivity.reduction(depth, move_number) == 0)
+                or b.gives_check(m)):
+            return 0
+        if futile:
+            self.selectivity.futility_prunes += 1
+            return None
+        self.selectivity.reductions += 1
+        return self.selectivity.reduction(depth, move_number)
+
+    def quiescence(self, b: chess.Board, alpha: int, beta: int) -> int:
+        """
+        Search captures and promotions only, until the position is quiet.
+
+        The side to move can always "stand pat" and keep the static evaluation instead of capturing, so the score is
+        never worse than the static evaluation.
+        """
+        self.nodes += 1
+        self.check_limits()
+        stand_pat = self.evaluate(b)
+        if stand_pat >= beta:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+
+        best = stand_pat
+        for m, gain in self.orderer.tactical_moves(b):
+            # Delta pruning: skip captures that can't bring the score back up to alpha.
+            if not m.promotion and stand_pat + gain + DELTA_MARGIN <= alpha:
+                continue
+            self.evaluator.push(b, m)
+            try:
+                score = -self.quiescence(b, -beta, -alpha)
+            finally:
+                self.evaluator.pop(b)
+            best = max(best, score)
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                break
+        return best
+
+    def evaluate(self, b: chess.Board) -> int:
+        """Get the static evaluation from the point of view of the side to move."""
+        score = self.evaluator.evaluate(b)
+        return score if b.turn == chess.WHITE else -score
+
+    def probe_tt(self, key: int, depth: int, ply: int, alpha: int,
+                 beta: int) -> tuple[int | None, int, int, chess.Move | None]:
+        """
+        Use the transposition table entry of a position, if any.
+
+        Mate scores are stored as the distance from the position (see `score_to_tt`), and turned back into the distance
+        from the root, `ply` plies away.
+
+        :return: The score to return if the entry is enough to cut off the search (else None), the narrowed alpha and
+            beta, and the stored best move.
+        """
+        entry = self.tt.probe(key)
+        if entry is None:
+            return None, alpha, beta, None
+        entry_depth, bound, tt_score, tt_move = entry
+        score = score_from_tt(tt_score, ply)
+        if entry_depth >= depth:
+            if bound == LOWER:
+                alpha = max(alpha, score)
+            elif bound == UPPER:
+                beta = min(beta, score)
+            if bound == EXACT or alpha >= beta:
+                if self.tt.refresh(key):
+                    self.reused_cutoffs[min(depth, MAX_DEPTH)] += 1
+                return score, alpha, beta, tt_move
+        return None, alpha, beta, tt_move
+
+    def principal_variation(self, board: chess.Board, best_move: chess.Move, max_length: int) -> list[chess.Move]:
+        """Follow the best moves stored in the transposition table, starting with `best_move`."""
+        b = board.copy(stack=False)
+        pv = [best_move]
+        b.push(best_move)
+        seen = {chess.polyglot.zobrist_hash(b)}
+        while len(pv) < max_length:
+            entry = self.tt.probe(chess.polyglot.zobrist_hash(b))
+            if entry is None or entry[3] is None or not b.is_legal(entry[3]):
+                break
+            pv.append(entry[3])
+            b.push(entry[3])
+            key = chess.polyglot.zobrist_hash(b)
+            if key in seen:
+                break
+            seen.add(key)
+        return pv
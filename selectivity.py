@@ -0,0 +1,119 @@
+"""Selective search techniques (pruning, reductions and extensions) of the homemade engine, and their settings."""
+import math
+import chess
+import eval
+from lib.lichess_types import OPTIONS_GO_EGTB_TYPE
+
+FUTILITY_MARGINS = (0, 200, 400)  # By remaining depth. Quiet moves can't raise the score by more than this.
+REVERSE_FUTILITY_MARGIN = 120  # Per ply of remaining depth.
+REVERSE_FUTILITY_MAX_DEPTH = 3
+RAZOR_MARGINS = (0, 300, 500)  # By remaining depth.
+NULL_MOVE_MIN_DEPTH = 3
+NULL_MOVE_MIN_PIECES = 7  # Null-move pruning is unsafe in endgames, where zugzwang is common.
+LMR_MIN_DEPTH = 3
+LMR_MIN_MOVES = 3  # The first few moves of a node are never reduced.
+MAX_CHECK_EXTENSION_PLY = 32  # Stop extending checks this far from the root so perpetual checks can't blow up the tree.
+
+# The late move reduction for [remaining depth][move number].
+LMR_TABLE = [[0 if depth < 1 or move < 1 else int(0.75 + math.log(depth) * math.log(move) / 2.25)
+              for move in range(64)]
+             for depth in range(64)]
+
+OPTION_NAMES = {"NullMove": "null_move",
+                "LateMoveReductions": "late_move_reductions",
+                "Futility": "futility",
+                "ReverseFutility": "reverse_futility",
+                "Razoring": "razoring",
+                "CheckExtensions": "check_extensions"}
+
+
+def is_enabled(value: object) -> bool:
+    """Read a boolean homemade option. YAML gives a bool, but a string or a number is accepted as well."""
+    if isinstance(value, str):
+        return value.strip().lower() not in ("false", "off", "no", "0", "")
+    return bool(value)
+
+
+class Selectivity:
+    """
+    Which selective search techniques are enabled, and how often each one was used in the last search.
+
+    Each technique can be turned off in the engine's `homemade_options`, e.g. `NullMove: false`, so that its effect
+    on speed and depth can be measured on its own.
+    """
+
+    def __init__(self, options: OPTIONS_GO_EGTB_TYPE | None = None) -> None:
+        """:param options: The engine's `homemade_options`. Techniques not mentioned there are enabled."""
+        options = options or {}
+        self.null_move = True
+        self.late_move_reductions = True
+        self.futility = True
+        self.reverse_futility = True
+        self.razoring = True
+        self.check_extensions = True
+        for option_name, attribute in OPTION_NAMES.items():
+            if option_name in options:
+                setattr(self, attribute, is_enabled(options[option_name]))
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        """Reset the counters."""
+        self.null_move_cutoffs = 0
+        self.reductions = 0
+        self.reduction_researches = 0
+        self.futility_prunes = 0
+        self.reverse_futility_prunes = 0
+        self.razor_prunes = 0
+        self.check_extensions_done = 0
+
+    def can_null_move(self, b: chess.Board, depth: int, static_eval: int, beta: int) -> bool:
+        """
+        Check whether the side to move can pass to try for a quick beta cutoff.
+
+        Passing twice in a row is pointless, and in positions with few pieces or only pawns passing might be the only
+        thing that is not possible (zugzwang), so the null-move observation does not hold there.
+        """
+        return (self.null_move
+                and depth >= NULL_MOVE_MIN_DEPTH
+                and static_eval >= beta
+                and bool(b.move_stack) and bool(b.move_stack[-1])
+                and bool(b.occupied_co[b.turn] & ~(b.pawns | b.kings))
+                and eval.num_pieces(b) >= NULL_MOVE_MIN_PIECES)
+
+    def null_move_reduction(self, depth: int) -> int:
+        """Get how much shallower the search after a null move is."""
+        return 3 if depth >= 6 else 2
+
+    def can_reverse_futility_prune(self, depth: int, static_eval: int, beta: int) -> bool:
+        """Check whether the static evaluation is so far above beta that a shallow search won't bring it back down."""
+        return (self.reverse_futility
+                and depth <= REVERSE_FUTILITY_MAX_DEPTH
+                and static_eval - REVERSE_FUTILITY_MARGIN * depth >= beta)
+
+    def can_razor(self, depth: int, static_eval: int, alpha: int) -> bool:
+        """Check whether the static evaluation is so far below alpha that only captures are worth searching."""
+        return self.razoring and depth < len(RAZOR_MARGINS) and static_eval + RAZOR_MARGINS[depth] < alpha
+
+    def is_futile(self, depth: int, static_eval: int, alpha: int) -> bool:
+        """Check whether quiet moves at a frontier node can't raise the score up to alpha."""
+        return self.futility and depth < len(FUTILITY_MARGINS) and static_eval + FUTILITY_MARGINS[depth] <= alpha
+
+    def reduction(self, depth: int, move_number: int) -> int:
+        """Get the late move reduction of a quiet move, leaving at least one ply to search."""
+        if not self.late_move_reductions or depth < LMR_MIN_DEPTH or move_number < LMR_MIN_MOVES:
+            return 0
+        return max(0, min(LMR_TABLE[min(depth, 63)][min(move_number, 63)], depth - 2))
+
+    def extension(self, in_check: bool, ply: int) -> int:
+        """Get how many plies to add to the search of a position: one if the side to move is in check."""
+        if self.check_extensions and in_check and ply <= MAX_CHECK_EXTENSION_PLY:
+            self.check_extensions_done += 1
+            return 1
+        return 0
+
+    def stats(self) -> str:
+        """Get a human-readable summary of the counters."""
+        return (f"Selectivity: {self.null_move_cutoffs} null-move cutoffs, {self.reductions} reductions "
+                f"({self.reduction_researches} re-searched), {self.futility_prunes} futility, "
+                f"{self.reverse_futility_prunes} reverse futility and {self.razor_prunes} razoring prunes, "
+                f"{self.check_extensions_done} check extensions")
@@ -0,0 +1,223 @@
+"""Test pondering by homemade engines and the local tablebases and opening books of the engine wrapper."""
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import cast
+import chess
+import chess.gaviota
+import chess.polyglot
+import pytest
+from chess.engine import Limit, PlayResult
+from homemade import MyBot, PONDER_HASH_OPTION
+from search import allocate_time
+from lib.config import Configuration
+from lib.lichess_types import MOVE
+from lib import engine_wrapper
+
+
+def test_homemade_ponder() -> None:
+    """Test that the result of pondering is used on a ponder hit and dropped on a miss."""
+    draw_or_resign = Configuration({"offer_draw_enabled": False, "offer_draw_moves": 10, "offer_draw_score": 0,
+                                    "offer_draw_pieces": 10, "resign_enabled": False, "resign_moves": 3,
+                                    "resign_score": -1000})
+    engine = MyBot([], {"Hash": 1}, None, draw_or_resign)
+    try:
+        board = chess.Board("r1bq1rk1/ppp2ppp/2np1n2/2b1p3/2B1P3/2NP1N2/PPP2PPP/R1BQ1RK1 w - - 0 7")
+        result = engine.search(board, Limit(depth=2))
+        assert result.move is not None
+        assert result.ponder is not None
+
+        engine.start_pondering(board, result, Limit(depth=3))
+        board.push(result.move)
+        board.push(result.ponder)
+        ponder_result = engine.stop_pondering(board)
+        assert ponder_result is not None
+        assert ponder_result.move is not None
+        assert board.is_legal(ponder_result.move)
+        assert ponder_result.info["depth"] == 3
+        scores = len(engine.scores)
+        assert engine.check_result(ponder_result, board) is ponder_result
+        assert len(engine.scores) == scores + 1
+        assert engine.scores[-1] == ponder_result.info["score"]
+
+        result = engine.search(board, Limit(depth=2))
+        assert result.move is not None
+        assert result.ponder is not None
+        engine.start_pondering(board, result, Limit(time=60))
+        board.push(result.move)
+        board.push(next(move for move in board.legal_moves if move != result.ponder))
+        assert engine.stop_pondering(board) is None
+        assert engine.ponder_process is not None
+        assert engine.ponder_process.is_alive()
+
+        # A hit whose result is not wanted (a book move is played instead) stops the search without waiting for it.
+        result = engine.search(board, Limit(depth=2))
+        assert result.move is not None
+        assert result.ponder is not None
+        engine.start_pondering(board, result, Limit(depth=100))
+        board.push(result.move)
+        board.push(result.ponder)
+        start = time.monotonic()
+        assert engine.stop_pondering(board, wait=False) is None
+        assert time.monotonic() - start < engine_wrapper.PONDER_STOP_TIMEOUT
+        assert engine.ponder_board is None
+    finally:
+        engine.quit()
+    assert engine.ponder_process is None
+
+
+def test_syzygy_tablebases_stay_open(tmp_path: Path) -> None:
+    """Test that the syzygy tablebases of a list of directories are opened once and then reused."""
+    first, second = tmp_path / "first", tmp_path / "second"
+    first.mkdir()
+    second.mkdir()
+    tablebase = engine_wrapper.open_syzygy([str(first), str(second)])
+    assert engine_wrapper.open_syzygy([str(first), str(second)]) is tablebase
+    assert engine_wrapper.open_syzygy([str(first)]) is not tablebase
+
+
+class CountingTablebase:
+    """A stand-in for gaviota tablebases that gives every position a DTM of 10 and counts the probes."""
+
+    def __init__(self) -> None:
+        """Start with no probes."""
+        self.probes = 0
+
+    def probe_dtm(self, _board: chess.Board) -> int:
+        """Count the probe and return the DTM."""
+        self.probes += 1
+        return 10
+
+
+def test_gaviota_probe_cache(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that gaviota probes of the same position are answered from the cache, and that the cache is bounded."""
+    monkeypatch.setattr(engine_wrapper, "gaviota_probes", OrderedDict())
+    monkeypatch.setattr(engine_wrapper, "GAVIOTA_PROBE_CACHE_SIZE", 4)
+    counting = CountingTablebase()
+    tablebase = cast(chess.gaviota.PythonTablebase, counting)
+    board = chess.Board("8/8/8/8/8/2k5/8/K1Q5 w - - 0 1")
+    moves = engine_wrapper.score_gaviota_moves(board, engine_wrapper.dtm_scorer, tablebase)
+    assert counting.probes == len(moves) == board.legal_moves.count()
+    assert len(engine_wrapper.gaviota_probes) == 4
+
+    board.halfmove_clock = 10
+    last_moves = list(board.legal_moves)[-4:]
+    for move in last_moves:
+        board.push(move)
+        assert engine_wrapper.dtm_scorer(tablebase, board) == -21  # One more halfmove after the move.
+        board.pop()
+    assert counting.probes == len(moves)
+
+
+def test_book_readers(tmp_path: Path) -> None:
+    """Test that opening books are opened once and that each selection method picks from a single lookup."""
+    board = chess.Board()
+    key = chess.polyglot.zobrist_hash(board)
+    moves = [(chess.E2, chess.E4, 10), (chess.D2, chess.D4, 5), (chess.G1, chess.F3, 0)]
+    book = tmp_path / "book.bin"
+    book.write_bytes(b"".join(chess.polyglot.ENTRY_STRUCT.pack(key, to_square | from_square << 6, weight, 0)
+                              for from_square, to_square, weight in moves))
+    reader = engine_wrapper.open_book(str(book))
+    assert engine_wrapper.open_book(str(book)) is reader
+    entries = list(reader.find_all(board, minimum_weight=0))
+    assert len(entries) == 3
+
+    def select(selection: str, min_weight: int, normalization: str = "none") -> chess.Move | None:
+        config = Configuration({"selection": selection, "min_weight": min_weight, "normalization": normalization})
+        return engine_wrapper.select_book_move(entries, config)
+
+    e4, d4 = chess.Move.from_uci("e2e4"), chess.Move.from_uci("d2d4")
+    assert select("best_move", 1) == e4
+    assert select("best_move", 20) is None
+    assert select("uniform_random", 6) == e4
+    assert select("uniform_random", 40, "max") in {e4, d4}
+    assert select("uniform_random", 60, "sum") == e4
+    assert select("weighted_random", 100) in {e4, d4}
+    assert engine_wrapper.select_book_move([], Configuration({"selection": "weighted_random", "min_weight": 1,
+                                                              "normalization": "none"})) is None
+
+
+def test_homemade_hash_is_shared_on_demand() -> None:
+    """Test that the table of a single-process engine is private until it ponders, and keeps its entries then."""
+    engine = MyBot([], {"Hash": 1}, None, Configuration({}))
+    try:
+        assert engine.tt.shared_memory is None
+        board = chess.Board()
+        engine.search(board, Limit(depth=2))
+        entry = engine.tt.probe(chess.polyglot.zobrist_hash(board))
+        assert entry is not None
+        options = engine.ponder_options()
+        assert engine.tt.shared_memory is not None
+        assert options[PONDER_HASH_OPTION] == engine.tt.shared_memory.name
+        assert engine.searcher.tt is engine.tt
+        assert engine.tt.probe(chess.polyglot.zobrist_hash(board)) == entry
+        engine.ponder_options()
+        assert options[PONDER_HASH_OPTION] == engine.tt.shared_memory.name
+    finally:
+        engine.quit()
+
+
+def test_homemade_ponder_shares_hash_and_stops_at_move_time() -> None:
+    """Test that the pondering instance searches in the engine's table with one process and is stopped on a hit."""
+    engine = MyBot([], {"Hash": 1, "Threads": 2}, None, Configuration({}))
+    try:
+        options = engine.ponder_options()
+        assert options["Threads"] == 1
+        assert engine.tt.shared_memory is not None
+        assert options[PONDER_HASH_OPTION] == engine.tt.shared_memory.name
+
+        board = chess.Board("r1bq1rk1/ppp2ppp/2np1n2/2b1p3/2B1P3/2NP1N2/PPP2PPP/R1BQ1RK1 w - - 0 7")
+        limit = Limit(white_clock=60, black_clock=60)
+        assert engine.ponder_hit_timeout(board, limit) == allocate_time(board, limit)[1]
+
+        result = engine.search(board, Limit(depth=2))
+        assert result.move is not None
+        assert result.ponder is not None
+        engine.start_pondering(board, result, Limit(depth=3))
+        board.push(result.move)
+        board.push(result.ponder)
+        assert engine.stop_pondering(board) is not None
+        entry = engine.tt.probe(chess.polyglot.zobrist_hash(board))
+        assert entry is not None
+        assert entry[0] == 3
+
+        result = engine.search(board, Limit(depth=2))
+        assert result.move is not None
+        assert result.ponder is not None
+        engine.start_pondering(board, result, Limit(depth=100))
+        board.push(result.move)
+        board.push(result.ponder)
+        start = time.monotonic()
+        ponder_result = engine.ponder_result(0.5)
+        assert time.monotonic() - start < 0.5 + engine_wrapper.PONDER_STOP_TIMEOUT
+        assert ponder_result is not None
+        assert ponder_result.move is not None
+        assert board.is_legal(ponder_result.move)
+    finally:
+        engine.quit()
+
+
+class FirstMoveEngine(engine_wrapper.MinimalEngine):
+    """A homemade engine that plays the first legal move and doesn't change how the engine is closed."""
+
+    def search(self, board: chess.Board, _time_limit: Limit, _ponder: bool, _draw_offered: bool,
+               _root_moves: MOVE) -> PlayResult:
+        """Play the first legal move."""
+        return PlayResult(next(iter(board.legal_moves)), None)
+
+
+def ponder_then_fail(engine: FirstMoveEngine) -> None:
+    """Start pondering inside the engine's context, then fail."""
+    with engine:
+        engine.start_pondering(chess.Board(), PlayResult(chess.Move.from_uci("e2e4"), chess.Move.from_uci("e7e5")),
+                               Limit(depth=1))
+        assert engine.ponder_process is not None
+        raise RuntimeError
+
+
+def test_pondering_stops_on_exception() -> None:
+    """Test that leaving a homemade engine because of an exception stops the process that ponders."""
+    engine = FirstMoveEngine([], {}, None, Configuration({}))
+    with pytest.raises(RuntimeError):
+        ponder_then_fail(engine)
+    assert engine.ponder_process is None
@@ -0,0 +1,139 @@
+"""Test the evaluation of the homemade engine."""
+import chess
+import chess.polyglot
+from chess.engine import Limit
+import eval
+import positions
+from search import Searcher
+from transposition import TranspositionTable
+
+
+def test_incremental_evaluation() -> None:
+    """Test that the incremental evaluation and key follow castling, en passant and promotions, and undo them."""
+    board = chess.Board("r3k2r/6P1/8/8/3p4/8/4P3/R3K2R w KQkq - 0 1")
+    evaluator = eval.IncrementalEvaluator(debug=True)
+    evaluator.reset(board)
+    start = evaluator.psqt()
+    for move in ["e2e4", "d4e3", "e1g1", "e8c8", "g7h8q", "d8h8"]:
+        assert board.is_legal(chess.Move.from_uci(move))
+        assert eval.move_keys(board, chess.Move.from_uci(move)) == eval.move_delta(board, chess.Move.from_uci(move))[3]
+        evaluator.push(board, chess.Move.from_uci(move))
+        assert evaluator.psqt() == eval.psqt_score(board)
+        assert evaluator.phase == eval.game_phase(board)
+        assert evaluator.key == chess.polyglot.zobrist_hash(board)
+        assert evaluator.evaluate(board) == eval.evaluate(board)
+    while board.move_stack:
+        evaluator.pop(board)
+    assert evaluator.psqt() == start
+    assert evaluator.key == chess.polyglot.zobrist_hash(board)
+
+
+def test_incremental_evaluation_chess960() -> None:
+    """Test castling in chess960, where the king moves onto its rook."""
+    board = chess.Board("1rk3r1/8/8/8/8/8/8/1RK3R1 w GBgb - 0 1", chess960=True)
+    evaluator = eval.IncrementalEvaluator()
+    evaluator.reset(board)
+    for move in ["c1b1", "c8b8"]:
+        assert board.is_castling(chess.Move.from_uci(move))
+        assert eval.move_keys(board, chess.Move.from_uci(move)) == eval.move_delta(board, chess.Move.from_uci(move))[3]
+        evaluator.push(board, chess.Move.from_uci(move))
+        assert evaluator.psqt() == eval.psqt_score(board)
+
+
+def test_search_with_evaluation_check() -> None:
+    """Test that a search with the incremental evaluation checked at every node runs through."""
+    searcher = Searcher.from_options(TranspositionTable(1), {"EvalDebug": True})
+    assert searcher.evaluator.debug
+    board = chess.Board("r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3")
+    result = searcher.search(board, Limit(depth=3))
+    assert result.move is not None
+
+
+def test_piece_square_tables() -> None:
+    """Test that the precomputed tables include the material and mirror black's pieces."""
+    for tables in (eval.PSQT, eval.PSQT_ENDGAME):
+        for piece_type in chess.PIECE_TYPES:
+            for square in chess.SQUARES:
+                assert tables[chess.BLACK][piece_type][square] == -tables[chess.WHITE][piece_type][square ^ 56]
+    assert eval.PSQT[chess.WHITE][chess.PAWN][chess.E2] == eval.PIECE_VALUES[chess.PAWN] + positions.pawnTable[chess.E2]
+
+
+def test_tapered_evaluation() -> None:
+    """Test that the piece-square values move from the midgame tables to the endgame tables as pieces are traded."""
+    board = chess.Board()
+    assert eval.game_phase(board) == eval.MAX_PHASE
+    assert eval.psqt_score(board) == eval.psqt_scores(board)[0] == 0
+    assert eval.taper(100, 0, eval.MAX_PHASE // 2) == 50
+    assert eval.taper(100, 0, eval.MAX_PHASE + 4) == 100
+
+    corner = chess.Board("8/4k3/4p3/8/8/4P3/8/7K w - - 0 1")
+    center = chess.Board("8/4k3/4p3/8/4K3/4P3/8/8 w - - 0 1")
+    assert eval.game_phase(center) == 0
+    assert eval.psqt_score(center) > eval.psqt_score(corner)
+
+
+def test_evaluation_terms() -> None:
+    """Test the pawn structure and king safety terms, including kings on the last rank."""
+    board = chess.Board("4K3/8/8/8/8/2P5/2P2PPP/6k1 w - - 0 1")
+    assert eval.pawn_structure(board) == -eval.DOUBLED_PAWN_PENALTY
+    assert eval.king_safety(board) == 0
+    board = chess.Board("6k1/5ppp/8/8/8/8/5PPP/6K1 w - - 0 1")
+    assert eval.king_safety(board) == 0
+    assert eval.king_safety(chess.Board("6k1/5pp1/8/8/8/8/5PPP/6K1 w - - 0 1")) == eval.SHIELD_PAWN_BONUS
+    assert eval.get_material_values(board) == (0, 2300, 2300)
+    assert eval.num_pieces(board) == 8
+
+
+def test_pawn_hash_table() -> None:
+    """Test that the pawn hash table returns the pawn structure score and counts its hits."""
+    table = eval.PawnHashTable(64)
+    board = chess.Board("4K3/8/8/8/8/2P5/2P2PPP/6k1 w - - 0 1")
+    assert table.pawn_structure(board) == eval.pawn_structure(board)
+    board.push(chess.Move.from_uci("e8d7"))
+    assert table.pawn_structure(board) == eval.pawn_structure(board)
+    assert (table.hits, table.probes) == (1, 2)
+    board.push(chess.Move.from_uci("h2h4"))
+    assert table.pawn_structure(board) == eval.pawn_structure(board)
+    assert table.hits == 1
+    assert "1/3 hits" in table.stats()
+
+    searcher = Searcher.from_options(TranspositionTable(1), {"PawnHash": 128})
+    assert searcher.evaluator.pawn_table.size == 128
+    searcher.search(chess.Board(), Limit(depth=3))
+    assert searcher.evaluator.pawn_table.hits > 0
+
+
+def test_eval_cache() -> None:
+    """Test that the evaluation cache returns stored evaluations, replaces them, and counts its hits and misses."""
+    cache = eval.EvalCache(16)
+    assert cache.probe(5) is None
+    cache.store(5, 123)
+    assert cache.probe(5) == 123
+    cache.store(21, 456)
+    assert cache.probe(5) is None
+    assert cache.probe(21) == 456
+    assert (cache.hits, cache.misses) == (2, 2)
+
+    searcher = Searcher.from_options(TranspositionTable(1), {"EvalCache": 1024})
+    assert searcher.evaluator.cache.size == 1024
+    board = chess.Board("r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3")
+    searcher.search(board, Limit(depth=3))
+    assert searcher.evaluator.cache.hits > 0
+
+
+def test_evaluate_batch() -> None:
+    """Test that the batched evaluation gives the same scores as `evaluate`, including positions without kings."""
+    boards = [chess.Board(fen) for fen in ("r3k2r/6P1/8/8/3p4/8/4P3/R3K2R w KQkq - 0 1",
+                                           "4K3/8/8/8/8/2P5/2P2PPP/6k1 w - - 0 1",
+                                           "8/8/4k3/3p4/3P4/4K3/8/8 w - - 0 1",
+                                           "8/8/8/8/8/8/8/8 w - - 0 1")]
+    board = chess.Board()
+    for move in ["e2e4", "d7d5", "e4d5", "d8d5", "b1c3", "d5a5", "d2d4", "c7c6", "g1f3", "c8g4"]:
+        board.push_uci(move)
+        boards.append(board.copy())
+    assert eval.evaluate_batch(boards).tolist() == [eval.evaluate(board) for board in boards]
+
+    searcher = Searcher(TranspositionTable(1))
+    scores = searcher.static_move_scores(board, list(board.legal_moves))
+    board.push_uci("f1e2")
+    assert scores[chess.Move.from_uci("f1e2")] == eval.evaluate(board)
@@ -0,0 +1,25 @@
+"""Test the move ordering of the homemade engine."""
+import chess
+from move_ordering import MoveOrderer
+
+
+def test_order() -> None:
+    """Test that the TT move, captures and killer moves come first, in that order."""
+    board = chess.Board("4k3/8/8/3p4/4P3/8/8/R3K3 w - - 0 1")
+    orderer = MoveOrderer()
+    tt_move = chess.Move.from_uci("a1a7")
+    killer = chess.Move.from_uci("e1d2")
+    orderer.record_cutoff(board, killer, 3, 2, 4)
+    moves = orderer.order(board, tt_move, 2)
+    assert moves[:3] == [tt_move, chess.Move.from_uci("e4d5"), killer]
+    assert set(moves) == set(board.legal_moves)
+    assert orderer.cutoffs == 1
+    assert orderer.first_move_cutoffs == 0
+    assert orderer.ordered_nodes == 1
+
+
+def test_tactical_moves() -> None:
+    """Test that captures are sorted by victim value, then by attacker value."""
+    board = chess.Board("4k3/8/8/1q1r4/4P3/2N5/8/4K3 w - - 0 1")
+    moves = [move.uci() for move, _ in MoveOrderer().tactical_moves(board)]
+    assert moves == ["c3b5", "e4d5", "c3d5"]
@@ -0,0 +1,43 @@
+"""Test the neural network evaluation of the homemade engine."""
+from pathlib import Path
+import numpy as np
+import chess
+import chess.polyglot
+from chess.engine import Limit
+import nnue
+from search import Searcher
+from transposition import TranspositionTable
+
+
+def test_incremental_accumulator() -> None:
+    """Test that the accumulator follows castling, en passant and promotions, and undoes them."""
+    network = nnue.Network.random(hidden_size=16)
+    board = chess.Board("r3k2r/6P1/8/8/3p4/8/4P3/R3K2R w KQkq - 0 1")
+    evaluator = nnue.NNUEEvaluator(network, debug=True)
+    evaluator.reset(board)
+    start = evaluator.accumulator
+    for move in ["e2e4", "d4e3", "e1g1", "e8c8", "g7h8q", "d8h8"]:
+        assert board.is_legal(chess.Move.from_uci(move))
+        evaluator.push(board, chess.Move.from_uci(move))
+        assert np.array_equal(evaluator.accumulator, network.accumulator(board))
+        assert evaluator.evaluate(board) == network.output(network.accumulator(board))
+        assert evaluator.key == chess.polyglot.zobrist_hash(board)
+    while board.move_stack:
+        evaluator.pop(board)
+    assert np.array_equal(evaluator.accumulator, start)
+    assert evaluator.key == chess.polyglot.zobrist_hash(board)
+
+
+def test_network_file(tmp_path: Path) -> None:
+    """Test that a saved network is loaded with the same weights, and can be chosen in the homemade options."""
+    network = nnue.Network.random(hidden_size=16, seed=1)
+    path = str(tmp_path / "network.npz")
+    network.save(path)
+    loaded = nnue.Network.load(path)
+    board = chess.Board()
+    assert loaded.output(loaded.accumulator(board)) == network.output(network.accumulator(board))
+
+    searcher = Searcher.from_options(TranspositionTable(1), {"NNUEWeights": path, "EvalDebug": True})
+    assert isinstance(searcher.evaluator, nnue.NNUEEvaluator)
+    result = searcher.search(board, Limit(depth=2))
+    assert result.move is not None
@@ -0,0 +1,64 @@
+"""Test the multi-process search of the homemade engine."""
+import chess
+from chess.engine import Limit
+from parallel import LazySMP, RootSplit, decode_board, encode_board, worker_count
+from search import Searcher
+from transposition import TranspositionTable
+
+
+def test_encode_board() -> None:
+    """Test that a board is sent with just enough history to detect repetitions."""
+    board = chess.Board()
+    for move in ["e2e4", "e7e5", "g1f3", "b8c6", "f3g1", "c6b8", "g1f3"]:
+        board.push_uci(move)
+    fen, moves = encode_board(board)
+    assert moves == ["g1f3", "b8c6", "f3g1", "c6b8", "g1f3"]
+    decoded = decode_board(fen, moves)
+    assert decoded.fen() == board.fen()
+    decoded.push_uci("b8c6")
+    assert decoded.can_claim_threefold_repetition() is False
+    decoded.push_uci("f3g1")
+    decoded.push_uci("c6b8")
+    assert decoded.is_repetition(3)
+
+
+def test_worker_count() -> None:
+    """Test that the number of search processes is at least one and never more than asked for."""
+    assert worker_count(1, 1) == 1
+    assert worker_count(0, 1) == 1
+    assert worker_count(4, 10_000) == 1
+    assert 1 <= worker_count(4, 1) <= 4
+
+
+def test_lazy_smp() -> None:
+    """Test that helper processes share the transposition table and stop when the engine quits."""
+    smp = LazySMP(2, 1, {})
+    try:
+        board = chess.Board("6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1")
+        result = smp.search(Searcher(smp.tt), board, Limit(time=1))
+        assert result.move == chess.Move.from_uci("a1a8")
+        assert result.info["nodes"] > 0
+        mated = chess.Board("R5k1/5ppp/8/8/8/8/8/6K1 b - - 1 1")
+        assert smp.search(Searcher(smp.tt), mated, Limit(time=1)).move is None
+    finally:
+        smp.close()
+    assert all(not process.is_alive() for process in smp.processes)
+
+
+def test_root_split() -> None:
+    """Test that the root moves split between processes are all searched and the best one is played."""
+    root_split = RootSplit(2, 1, {})
+    try:
+        board = chess.Board("6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1")
+        result = root_split.search(Searcher(TranspositionTable(1)), board, Limit(depth=2))
+        assert result.move == chess.Move.from_uci("a1a8")
+        assert result.info["pv"][0] == result.move
+        result = root_split.search(Searcher(TranspositionTable(1)), chess.Board(), Limit(depth=2))
+        assert result.info["depth"] == 2
+        result = root_split.search(Searcher(TranspositionTable(1)), chess.Board(), Limit(nodes=2000))
+        assert result.info["depth"] > 0
+        assert result.info["nodes"] >= 2000
+        stalemate = chess.Board("7k/5Q2/8/8/8/8/8/K7 b - - 0 1")
+        assert root_split.search(Searcher(TranspositionTable(1)), stalemate, Limit(depth=2)).move is None
+    finally:
+        root_split.close()
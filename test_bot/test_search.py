@@ -0,0 +1,139 @@
+"""Test the search of the homemade engine."""
+import chess
+from chess.engine import Limit, Cp, Mate
+import eval
+from search import (DEFAULT_DEPTH, INFINITY, MAX_DEPTH, Searcher, allocate_time, search_depth, engine_score, search_score,
+                    score_from_tt, score_to_tt)
+from transposition import TranspositionTable
+from selectivity import Selectivity, OPTION_NAMES
+
+
+def test_allocate_time() -> None:
+    """Test that the time used for a move stays within the clock."""
+    board = chess.Board()
+    assert allocate_time(board, None) == (None, None)
+    soft, hard = allocate_time(board, Limit(time=10))
+    assert soft is not None and hard is not None
+    assert soft < hard < 10
+    soft, hard = allocate_time(board, Limit(white_clock=60, black_clock=1, white_inc=1, black_inc=0))
+    assert soft is not None and hard is not None
+    assert soft <= hard <= 15
+    board.push_uci("e2e4")
+    _, hard = allocate_time(board, Limit(white_clock=60, black_clock=1, white_inc=1, black_inc=0))
+    assert hard is not None
+    assert hard <= 0.25
+
+
+def test_search_depth() -> None:
+    """Test that a depth or node limit is searched to without a clock, and that nothing limits the search to a default."""
+    assert search_depth(None, None) == DEFAULT_DEPTH
+    assert search_depth(Limit(depth=6), None) == 6
+    assert search_depth(Limit(depth=6), 1.0) == 6
+    assert search_depth(Limit(nodes=1000), None) == MAX_DEPTH
+    assert search_depth(Limit(white_clock=60, black_clock=60), 1.0) == MAX_DEPTH
+
+    board = chess.Board("r1bq1rk1/ppp2ppp/2np1n2/2b1p3/2B1P3/2NP1N2/PPP2PPP/R1BQ1RK1 w - - 0 7")
+    assert Searcher(TranspositionTable(1)).search(board, Limit(depth=DEFAULT_DEPTH + 1)).info["depth"] == DEFAULT_DEPTH + 1
+    result = Searcher(TranspositionTable(1)).search(board, Limit(nodes=20_000))
+    assert 19_000 <= result.info["nodes"] <= 20_000
+    assert result.info["depth"] > 0
+
+
+def test_search_finds_mate() -> None:
+    """Test that the search finds a mate in one and reports its statistics."""
+    board = chess.Board("6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1")
+    result = Searcher(TranspositionTable(1)).search(board, Limit(depth=2))
+    assert result.move == chess.Move.from_uci("a1a8")
+    assert result.info["depth"] >= 1
+    assert result.info["nodes"] > 0
+    assert result.info["pv"][0] == result.move
+    assert board == chess.Board("6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1")
+
+
+def test_mate_distance() -> None:
+    """Test that shorter mates score higher, are stored relative to the position and are reported in moves."""
+    searcher = Searcher(TranspositionTable(1))
+    for fen, depth, mate in (("7k/8/6K1/8/8/8/8/R7 w - - 0 1", 2, 1),
+                             ("7k/8/5K2/8/8/8/8/R7 w - - 0 1", 4, 2),
+                             ("7k/8/6K1/8/8/1p6/8/R7 b - - 0 1", 3, -1)):
+        result = searcher.search(chess.Board(fen), Limit(depth=depth))
+        assert result.info["score"].relative == Mate(mate)
+
+    for score in (eval.MATE_SCORE - 3, -(eval.MATE_SCORE - 4), 250):
+        assert score_from_tt(score_to_tt(score, 2), 2) == score
+        assert search_score(engine_score(score)) == score
+    assert score_to_tt(eval.MATE_SCORE - 3, 2) == eval.MATE_SCORE - 1
+    assert engine_score(-(eval.MATE_SCORE - 4)) == Mate(-2)
+    assert engine_score(250) == Cp(250)
+
+
+def test_terminal_positions() -> None:
+    """
+    Test that the search scores mates, stalemates and draws without `is_game_over`.
+
+    Stalemate is only found where all the moves are generated, not at the horizon.
+    """
+    searcher = Searcher(TranspositionTable(1))
+    for fen, score, depths in (("R5k1/5ppp/8/8/8/8/8/6K1 b - - 1 1", -(eval.MATE_SCORE - 1), (0, 2)),
+                               ("7k/5Q2/8/8/8/8/8/K7 b - - 0 1", 0, (1, 2)),
+                               ("8/8/4k3/8/8/4K3/8/4N3 w - - 0 1", 0, (0, 2)),
+                               ("4k3/8/8/8/8/8/4P3/R3K3 b - - 100 80", 0, (0, 2))):
+        board = chess.Board(fen)
+        searcher.evaluator.reset(board)
+        for depth in depths:
+            assert searcher.negamax(board, depth, 1, -INFINITY, INFINITY) == score
+
+    board = chess.Board("4k3/8/8/8/8/8/4P3/R3K3 w - - 0 1")
+    for move in ["a1a2", "e8d8", "a2a1", "d8e8"]:
+        board.push_uci(move)
+    searcher.evaluator.reset(board)
+    assert searcher.evaluator.is_repetition(board)
+    assert searcher.negamax(board, 2, 1, -INFINITY, INFINITY) == 0
+
+
+def test_no_legal_moves() -> None:
+    """Test that a search of a position without legal moves returns no move instead of failing."""
+    searcher = Searcher(TranspositionTable(1))
+    for fen in ("R5k1/5ppp/8/8/8/8/8/6K1 b - - 1 1", "7k/5Q2/8/8/8/8/8/K7 b - - 0 1"):
+        result = searcher.search(chess.Board(fen), Limit(depth=2))
+        assert result.move is None
+        assert result.ponder is None
+
+
+def test_quiescence_sees_recaptures() -> None:
+    """Test that a shallow search does not grab a defended pawn with the queen."""
+    board = chess.Board("4k3/8/3p4/4p3/8/8/8/4QK2 w - - 0 1")
+    result = Searcher(TranspositionTable(1)).search(board, Limit(depth=1))
+    assert result.move != chess.Move.from_uci("e1e5")
+
+
+def test_selectivity_options() -> None:
+    """Test that each selective technique can be turned off from the homemade options."""
+    selectivity = Selectivity({"NullMove": False, "Razoring": "false", "Futility": "on"})
+    assert not selectivity.null_move
+    assert not selectivity.razoring
+    assert selectivity.futility
+    assert selectivity.late_move_reductions
+    assert selectivity.reduction(2, 10) == 0
+    assert selectivity.reduction(8, 1) == 0
+    assert 0 < selectivity.reduction(8, 20) <= 6
+
+    board = chess.Board("6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1")
+    no_selectivity = Selectivity(dict.fromkeys(OPTION_NAMES, False))
+    result = Searcher(TranspositionTable(1), no_selectivity).search(board, Limit(depth=2))
+    assert result.move == chess.Move.from_uci("a1a8")
+
+
+def test_search_state_is_kept_between_moves() -> None:
+    """Test that the next search after the expected reply reuses the work of the previous one."""
+    board = chess.Board("r1bq1rk1/ppp2ppp/2np1n2/2b1p3/2B1P3/2NP1N2/PPP2PPP/R1BQ1RK1 w - - 0 7")
+    searcher = Searcher(TranspositionTable(1))
+    result = searcher.search(board, Limit(depth=4))
+    assert result.move is not None
+    assert result.ponder is not None
+    board.push(result.move)
+    board.push(result.ponder)
+    searcher.search(board, Limit(depth=3))
+    assert searcher.expected_reply
+    assert sum(searcher.reused_cutoffs) > 0
+    assert searcher.tt.reused > 0
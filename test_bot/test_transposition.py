@@ -0,0 +1,60 @@
+"""Test the transposition table of the homemade engine."""
+import chess
+import chess.polyglot
+from transposition import TranspositionTable, encode_move, decode_move, EXACT, LOWER
+
+
+def test_move_encoding() -> None:
+    """Test that packed moves round trip."""
+    for move in chess.Board("8/P7/8/8/8/8/7p/K6k w - - 0 1").legal_moves:
+        assert decode_move(encode_move(move)) == move
+    assert decode_move(encode_move(chess.Move.from_uci("a7a8n"))) == chess.Move.from_uci("a7a8n")
+    assert encode_move(None) == 0
+    assert decode_move(0) is None
+
+
+def test_probe_and_store() -> None:
+    """Test storing, probing and the replacement policy."""
+    tt = TranspositionTable(1)
+    key = chess.polyglot.zobrist_hash(chess.Board())
+    move = chess.Move.from_uci("e2e4")
+    assert tt.probe(key) is None
+    tt.store(key, 3, EXACT, 25, move)
+    assert tt.probe(key) == (3, EXACT, 25, move)
+    assert tt.hits == 1
+    assert tt.probes == 2
+
+    # A shallower result for a different position in the same slot does not replace the entry.
+    other_key = key + tt.size
+    tt.store(other_key, 2, LOWER, 50, None)
+    assert tt.probe(other_key) is None
+    tt.store(other_key, 4, LOWER, 50, None)
+    assert tt.probe(other_key) == (4, LOWER, 50, None)
+
+    # A result without a move keeps the best move of the same position.
+    tt.store(key, 5, EXACT, 10, move)
+    tt.store(key, 6, LOWER, 30, None)
+    assert tt.probe(key) == (6, LOWER, 30, move)
+
+    tt.clear()
+    assert tt.probe(key) is None
+    assert tt.hit_rate() == 0
+
+
+def test_generations() -> None:
+    """Test that entries of earlier searches are kept, but replaced first."""
+    tt = TranspositionTable(1)
+    key = chess.polyglot.zobrist_hash(chess.Board())
+    tt.store(key, 6, EXACT, 25, None)
+    tt.new_generation()
+    assert tt.probe(key) == (6, EXACT, 25, None)
+    assert tt.refresh(key)
+    assert not tt.refresh(key)
+    assert tt.reused == 1
+
+    # A shallower result replaces a deeper entry of an earlier search.
+    tt.new_generation()
+    other_key = key + tt.size
+    tt.store(other_key, 1, LOWER, 50, None)
+    assert tt.probe(other_key) == (1, LOWER, 50, None)
+    assert tt.probe(key) is None
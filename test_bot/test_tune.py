@@ -0,0 +1,59 @@
+"""Test the tuning of the homemade engine's evaluation."""
+import importlib.util
+from pathlib import Path
+import numpy as np
+import chess
+import eval
+import positions
+import tune
+
+GAMES = """[Event "Test"]
+[Result "1-0"]
+
+1. e4 e5 2. Nf3 Nc6 3. Bc4 Bc5 4. c3 Nf6 5. d4 exd4 6. cxd4 Bb4+ 7. Bd2 Bxd2+ 8. Nbxd2 d5 9. exd5 Nxd5
+10. Qb3 Nce7 11. O-O O-O 12. Rfe1 c6 13. a4 h6 14. Ne4 b6 15. Rac1 Bb7 1-0
+
+[Event "Test"]
+[Result "0-1"]
+
+1. d4 d5 2. c4 e6 3. Nc3 Nf6 4. Bg5 Be7 5. e3 O-O 6. Nf3 h6 7. Bh4 b6 8. cxd5 Nxd5 9. Bxe7 Qxe7
+10. Nxd5 exd5 11. Rc1 Be6 12. Qa4 c5 13. Qa3 Rc8 14. Bb5 a6 0-1
+"""
+
+
+def test_tune(tmp_path: Path) -> None:
+    """Test that the extracted positions give the engine's evaluation, that fitting lowers the loss, and the output."""
+    (tmp_path / "games.pgn").write_text(GAMES, encoding="utf-8")
+    (tmp_path / "notes.txt").write_text("Not a PGN file.", encoding="utf-8")
+    data = tune.extract(str(tmp_path), workers=2)
+    count = len(data["results"])
+    assert count > 10
+    assert set(data["results"].tolist()) == {0.0, 1.0}
+
+    board = chess.Board("r1bqk2r/pppp1ppp/2n2n2/2b1p3/2B1P3/2P2N2/PP1P1PPP/RNBQK2R b KQkq - 0 4")
+    indices, signs, phase, terms = tune.position_features(board)
+    single = {"indices": np.array([indices]), "signs": np.array([signs]), "phases": np.array([phase]),
+              "terms": np.array([terms])}
+    parameters = tune.initial_parameters()
+    assert abs(tune.scores(parameters, single)[0] - eval.evaluate(board)) <= 1
+
+    tuner = tune.Tuner(data, workers=2)
+    try:
+        loss, gradient = tuner.loss_and_gradient(parameters, 1.0)
+        total_loss, total_gradient = tune.loss_and_gradient(parameters, data, 1.0)
+        assert np.isclose(loss, total_loss / count)
+        assert np.allclose(gradient, total_gradient / count)
+        k = tuner.fit_k(parameters)
+        fitted = tuner.fit(parameters, k, iterations=20, learning_rate=2.0)
+        assert tuner.loss_and_gradient(fitted, k)[0] < tuner.loss_and_gradient(parameters, k)[0]
+    finally:
+        tuner.close()
+
+    output = tmp_path / "tuned_positions.py"
+    output.write_text(tune.positions_source(parameters), encoding="utf-8")
+    spec = importlib.util.spec_from_file_location("tuned_positions", output)
+    assert spec is not None and spec.loader is not None
+    tuned = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(tuned)
+    assert tuned.MIDGAME_TABLES == positions.MIDGAME_TABLES
+    assert tuned.ENDGAME_TABLES == positions.ENDGAME_TABLES
@@ -0,0 +1,202 @@
+"""A fixed-size transposition table for the homemade engine."""
+from multiprocessing.shared_memory import SharedMemory
+import chess
+
+# Bound types. A slot with bound EMPTY has never been written.
+EMPTY = 0
+EXACT = 1
+LOWER = 2  # The real score is at least the stored score (the search failed high).
+UPPER = 3  # The real score is at most the stored score (the search failed low).
+
+# key (8 bytes) + score (8 bytes) + move (2 bytes) + depth (1 byte) + bound (1 byte) + generation (1 byte)
+ENTRY_BYTES = 21
+GENERATIONS = 256
+DEFAULT_HASH_MB = 64
+
+
+def encode_move(move: chess.Move | None) -> int:
+    """Pack a move into 16 bits: 6 bits from-square, 6 bits to-square, 3 bits promotion. No move is 0."""
+    if move is None:
+        return 0
+    return move.from_square | move.to_square << 6 | (move.promotion or 0) << 12
+
+
+def decode_move(packed: int) -> chess.Move | None:
+    """Unpack a move packed by `encode_move`."""
+    if not packed:
+        return None
+    return chess.Move(packed & 63, packed >> 6 & 63, packed >> 12 or None)
+
+
+def entry_check(depth: int, bound: int, score: int, packed_move: int) -> int:
+    """
+    Get a 64-bit summary of the data of an entry.
+
+    The key is stored XOR-ed with it, so an entry that was half written by another process when it was read doesn't
+    match its position any more and is treated as a miss instead of returning a corrupt result.
+    """
+    return (score & 0xFFFFFFFF) << 32 | packed_move << 16 | (depth & 0xFF) << 8 | bound
+
+
+def table_entries(size_mb: float) -> int:
+    """Get the number of entries that fit in `size_mb` megabytes."""
+    return max(1, int(size_mb * 1024 * 1024) // ENTRY_BYTES)
+
+
+class TranspositionTable:
+    """
+    A direct-mapped table of search results keyed by a 64-bit Zobrist hash.
+
+    Entries are kept in parallel arrays laid over one fixed block of memory instead of a dict of objects, so that the
+    memory use is fixed by the configured size and does not grow during the game, and so that the block can be shared
+    by several processes (see `create_shared` and `attach`).
+
+    The table is kept for the whole game. Each search starts a new generation instead of clearing it, and entries
+    left by earlier searches are replaced first.
+    """
+
+    def __init__(self, size_mb: float = DEFAULT_HASH_MB, shared_memory: SharedMemory | None = None,
+                 owner: bool = False) -> None:
+        """
+        Lay out the table in memory.
+
+        :param size_mb: The memory budget of the table in megabytes.
+        :param shared_memory: The block of shared memory to use. The table uses private memory if None.
+        :param owner: Whether this table created `shared_memory` and should free it when closed.
+        """
+        self.size = table_entries(size_mb)
+        self.shared_memory = shared_memory
+        self.owner = owner
+        buffer = shared_memory.buf if shared_memory is not None else None
+        self.buffer = memoryview(buffer if buffer is not None else bytearray(ENTRY_BYTES * self.size))
+        size = self.size
+        self.keys = self.buffer[:8 * size].cast("Q")
+        self.scores = self.buffer[8 * size:16 * size].cast("q")
+        self.moves = self.buffer[16 * size:18 * size].cast("H")
+        self.depths = self.buffer[18 * size:19 * size].cast("b")
+        self.bounds = self.buffer[19 * size:20 * size].cast("B")
+        self.generations = self.buffer[20 * size:21 * size].cast("B")
+        self.generation = 0
+        self.reset_stats()
+
+    @classmethod
+    def create_shared(cls, size_mb: float = DEFAULT_HASH_MB) -> "TranspositionTable":
+        """Create a table in a new block of shared memory. Other processes can use it with `attach`."""
+        shared_memory = SharedMemory(create=True, size=ENTRY_BYTES * table_entries(size_mb))
+        table = cls(size_mb, shared_memory, owner=True)
+        table.clear()
+        return table
+
+    @classmethod
+    def attach(cls, name: str, size_mb: float) -> "TranspositionTable":
+        """Use a table created by `create_shared` in another process."""
+        return cls(size_mb, SharedMemory(name=name))
+
+    def to_shared(self) -> "TranspositionTable":
+        """Copy this table, entries and generation, into a new block of shared memory (see `create_shared`)."""
+        table = type(self).create_shared(self.size * ENTRY_BYTES / (1024 * 1024))
+        table.buffer[:] = self.buffer
+        table.generation = self.generation
+        return table
+
+    def close(self) -> None:
+        """Let go of the shared memory, and free it if this table created it."""
+        for view in (self.keys, self.scores, self.moves, self.depths, self.bounds, self.generations, self.buffer):
+            view.release()
+        if self.shared_memory is not None:
+            self.shared_memory.close()
+            if self.owner:
+                self.shared_memory.unlink()
+
+    def clear(self) -> None:
+        """Remove all entries and reset the counters."""
+        self.buffer[19 * self.size:] = bytes(2 * self.size)
+        self.generation = 0
+        self.reset_stats()
+
+    def new_generation(self) -> None:
+        """Start a new search. The entries of earlier searches are kept, but are the first to be replaced."""
+        self.generation = (self.generation + 1) % GENERATIONS
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        """Reset the probe and hit counters."""
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.reused = 0
+
+    def stored_key(self, index: int) -> int:
+        """Get the key of the position in a slot."""
+        return self.keys[index] ^ entry_check(self.depths[index], self.bounds[index], self.scores[index],
+                                              self.moves[index])
+
+    def probe(self, key: int) -> tuple[int, int, int, chess.Move | None] | None:
+        """
+        Look up a position.
+
+        :param key: The Zobrist hash of the position.
+        :return: (depth, bound, score, best move) if the position is in the table, else None.
+        """
+        self.probes += 1
+        index = key % self.size
+        bound = self.bounds[index]
+        if bound == EMPTY:
+            return None
+        depth, score, packed_move = self.depths[index], self.scores[index], self.moves[index]
+        if self.keys[index] ^ entry_check(depth, bound, score, packed_move) != key:
+            return None
+        self.hits += 1
+        return depth, bound, score, decode_move(packed_move)
+
+    def store(self, key: int, depth: int, bound: int, score: int, move: chess.Move | None) -> None:
+        """
+        Save a search result.
+
+        The slot is depth-preferred: a different position only replaces an entry of the current search if it was
+        searched at least as deep, but always replaces an entry of an earlier search. Results for the same position
+        always replace the old entry, but keep the old best move if the new result does not have one.
+        """
+        index = key % self.size
+        occupied = self.bounds[index] != EMPTY
+        same_position = occupied and self.stored_key(index) == key
+        if (occupied and not same_position and depth < self.depths[index]
+                and self.generations[index] == self.generation):
+            return
+        packed_move = self.moves[index] if move is None and same_position else encode_move(move)
+        self.keys[index] = key ^ entry_check(depth, bound, score, packed_move)
+        self.depths[index] = depth
+        self.bounds[index] = bound
+        self.scores[index] = score
+        self.moves[index] = packed_move
+        self.generations[index] = self.generation
+        self.stores += 1
+
+    def refresh(self, key: int) -> bool:
+        """
+        Mark the entry of a position as used by the current search, so it is not replaced first.
+
+        :return: Whether the entry was stored by an earlier search.
+        """
+        index = key % self.size
+        if self.generations[index] == self.generation or self.stored_key(index) != key:
+            return False
+        self.generations[index] = self.generation
+        self.reused += 1
+        return True
+
+    def hashfull(self) -> int:
+        """Get the permille of the table used by the current search, measured over the first thousand slots (as in UCI)."""
+        sample = min(1000, self.size)
+        used = sum(1 for bound, generation in zip(self.bounds[:sample], self.generations[:sample], strict=True)
+                   if bound != EMPTY and generation == self.generation)
+        return used * 1000 // sample
+
+    def hit_rate(self) -> float:
+        """Get the fraction of probes that found their position."""
+        return self.hits / self.probes if self.probes else 0.0
+
+    def stats(self) -> str:
+        """Get a human-readable summary of the table counters."""
+        return (f"TT: {self.hits}/{self.probes} hits ({self.hit_rate() * 100:.1f}%), {self.stores} stores, "
+                f"{self.reused} entries reused from earlier moves, {self.hashfull() / 10:.1f}% full")
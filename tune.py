@@ -0,0 +1,294 @@
+"""
+Texel tuning of the homemade engine's evaluation on the games saved in `pgn_directory`.
+
+Run `python tune.py extract` to collect the quiet positions of every game into a compact NumPy file, then
+`python tune.py fit positions.npz` to fit the piece-square tables (with the material) and the pawn terms of `eval.py`
+to the game results. The fit writes a file that can replace `positions.py`, and prints the pawn terms to copy into
+`eval.py`. Both steps use all the cores.
+
+A position is quiet when the side to move is not in check and the quiescence search agrees with the static
+evaluation, so that the evaluation is not asked to see tactics.
+"""
+import argparse
+import math
+import os
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+import numpy as np
+import numpy.typing as npt
+import yaml
+import chess
+import chess.pgn
+import eval
+import positions
+from search import INFINITY, Searcher
+from transposition import TranspositionTable
+
+OPENING_PLIES = 8  # The first moves of a game are often from a book and say little about the evaluation.
+MAX_PIECES = 32
+TABLE_SIZE = 6 * 64
+# The parameters: the midgame tables, the endgame tables, the doubled pawn penalty and the shield pawn bonus. The
+# tables are indexed by (piece_type - 1) * 64 + square, from white's side of the board, and include the material.
+PARAMETERS = 2 * TABLE_SIZE + 2
+RESULTS = {"1-0": 1.0, "0-1": 0.0, "1/2-1/2": 0.5}
+TABLE_NAMES = ["pawn", "knight", "bishop", "rook", "queen", "king"]
+
+Dataset = dict[str, npt.NDArray[Any]]
+
+
+def position_features(b: chess.Board) -> tuple[list[int], list[int], int, tuple[int, int]]:
+    """
+    Get what the evaluation of a position depends on.
+
+    :return: The table index of each piece, its sign (1 for white, -1 for black), the game phase, and the number of
+        doubled pawn files and of shield pawns of white minus those of black.
+    """
+    indices = []
+    signs = []
+    doubled = shield = 0
+    for color, sign, mirror in ((chess.WHITE, 1, 0), (chess.BLACK, -1, 56)):
+        occupied = b.occupied_co[color]
+        for piece_type, bb in ((chess.PAWN, b.pawns), (chess.KNIGHT, b.knights), (chess.BISHOP, b.bishops),
+                               (chess.ROOK, b.rooks), (chess.QUEEN, b.queens), (chess.KING, b.kings)):
+            for square in chess.scan_forward(bb & occupied):
+                indices.append((piece_type - 1) * 64 + (square ^ mirror))
+                signs.append(sign)
+        pawns = b.pawns & occupied
+        doubled += sign * sum(1 for file_mask in chess.BB_FILES if chess.popcount(pawns & file_mask) > 1)
+        king_mask = b.kings & occupied
+        if king_mask:
+            shield += sign * chess.popcount(eval.KING_SHIELD[color][chess.lsb(king_mask)] & pawns)
+    return indices, signs, min(eval.game_phase(b), eval.MAX_PHASE), (doubled, shield)
+
+
+def is_quiet(searcher: Searcher, b: chess.Board) -> bool:
+    """Whether the side to move is not in check and the quiescence search agrees with the static evaluation."""
+    if b.is_check():
+        return False
+    searcher.evaluator.reset(b)
+    return searcher.quiescence(b, -INFINITY, INFINITY) == searcher.evaluate(b)
+
+
+def extract_file(path: str) -> Dataset:
+    """Get the features and game result of the quiet positions of all the games in a PGN file."""
+    searcher = Searcher(TranspositionTable(1))
+    indices, signs, phases, terms, results = [], [], [], [], []
+    with open(path, encoding="utf-8", errors="replace") as pgn:
+        while (game := chess.pgn.read_game(pgn)) is not None:
+            result = RESULTS.get(game.headers.get("Result", "*"))
+            if result is None or game.errors:
+                continue
+            board = game.board()
+            for ply, move in enumerate(game.mainline_moves()):
+                board.push(move)
+                if ply + 1 < OPENING_PLIES or board.is_game_over() or not is_quiet(searcher, board):
+                    continue
+                piece_indices, piece_signs, phase, pawn_terms = position_features(board)
+                padding = MAX_PIECES - len(piece_indices)
+                indices.append(piece_indices + [0] * padding)
+                signs.append(piece_signs + [0] * padding)
+                phases.append(phase)
+                terms.append(pawn_terms)
+                results.append(result)
+    return {"indices": np.array(indices, dtype=np.int16).reshape(-1, MAX_PIECES),
+            "signs": np.array(signs, dtype=np.int8).reshape(-1, MAX_PIECES),
+            "phases": np.array(phases, dtype=np.int8),
+            "terms": np.array(terms, dtype=np.int8).reshape(-1, 2),
+            "results": np.array(results, dtype=np.float32)}
+
+
+def extract(pgn_directory: str, workers: int | None = None) -> Dataset:
+    """Extract the quiet positions of all the PGN files in a directory, one file per process."""
+    paths = sorted(os.path.join(pgn_directory, name) for name in os.listdir(pgn_directory) if name.endswith(".pgn"))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        parts = list(executor.map(extract_file, paths))
+    if not parts:
+        parts = [extract_file(os.devnull)]
+    return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+
+def initial_parameters() -> npt.NDArray[np.float64]:
+    """Get the parameters of the current evaluation."""
+    parameters = np.zeros(PARAMETERS)
+    for offset, tables in ((0, positions.MIDGAME_TABLES), (TABLE_SIZE, positions.ENDGAME_TABLES)):
+        for piece_type in chess.PIECE_TYPES:
+            start = offset + (piece_type - 1) * 64
+            parameters[start:start + 64] = eval.PIECE_VALUES[piece_type] + np.array(tables[piece_type])
+    parameters[2 * TABLE_SIZE:] = [-eval.DOUBLED_PAWN_PENALTY, eval.SHIELD_PAWN_BONUS]
+    return parameters
+
+
+def scores(parameters: npt.NDArray[np.float64], data: Dataset) -> npt.NDArray[np.float64]:
+    """Get the evaluation of each position with the given parameters, from white's point of view."""
+    midgame_share = data["phases"][:, np.newaxis] / eval.MAX_PHASE
+    tables = (midgame_share * parameters[data["indices"]]
+              + (1 - midgame_share) * parameters[TABLE_SIZE + data["indices"]])
+    result: npt.NDArray[np.float64] = (data["signs"] * tables).sum(axis=1) + data["terms"] @ parameters[2 * TABLE_SIZE:]
+    return result
+
+
+def win_probability(score: npt.NDArray[np.float64], k: float) -> npt.NDArray[np.float64]:
+    """Get the expected result for white of a position with an evaluation of `score` centipawns."""
+    probability: npt.NDArray[np.float64] = 1 / (1 + np.power(10.0, -k * score / 400))
+    return probability
+
+
+def loss_and_gradient(parameters: npt.NDArray[np.float64], data: Dataset,
+                      k: float) -> tuple[float, npt.NDArray[np.float64]]:
+    """Get the total logistic loss of the positions and its gradient with respect to the parameters."""
+    probability = np.clip(win_probability(scores(parameters, data), k), 1e-9, 1 - 1e-9)
+    results = data["results"]
+    loss = -float(np.sum(results * np.log(probability) + (1 - results) * np.log(1 - probability)))
+    score_gradient = (probability - results) * k * math.log(10) / 400
+    weighted = data["signs"] * score_gradient[:, np.newaxis]
+    midgame_share = data["phases"][:, np.newaxis] / eval.MAX_PHASE
+    indices = data["indices"].ravel()
+    gradient = np.concatenate([np.bincount(indices, (weighted * midgame_share).ravel(), TABLE_SIZE),
+                               np.bincount(indices, (weighted * (1 - midgame_share)).ravel(), TABLE_SIZE),
+                               data["terms"].T @ score_gradient])
+    return loss, gradient
+
+
+worker_data: Dataset = {}
+
+
+def init_worker(data: Dataset) -> None:
+    """Keep the positions in a worker process, so they are sent to it only once."""
+    worker_data.update(data)
+
+
+def chunk_loss_and_gradient(start: int, end: int, parameters: npt.NDArray[np.float64],
+                            k: float) -> tuple[float, npt.NDArray[np.float64]]:
+    """Get `loss_and_gradient` of the positions from `start` to `end` of the worker's data."""
+    return loss_and_gradient(parameters, {name: array[start:end] for name, array in worker_data.items()}, k)
+
+
+class Tuner:
+    """Split the loss and gradient computations of the positions between processes."""
+
+    def __init__(self, data: Dataset, workers: int | None = None) -> None:
+        """Start the worker processes and send them the positions."""
+        self.count = len(data["results"])
+        workers = max(1, min(workers or os.cpu_count() or 1, self.count))
+        bounds = np.linspace(0, self.count, workers + 1, dtype=int)
+        self.chunks = list(zip(bounds[:-1].tolist(), bounds[1:].tolist(), strict=True))
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(data,))
+
+    def close(self) -> None:
+        """Stop the worker processes."""
+        self.executor.shutdown()
+
+    def loss_and_gradient(self, parameters: npt.NDArray[np.float64], k: float) -> tuple[float, npt.NDArray[np.float64]]:
+        """Get the mean loss and its gradient over all the positions."""
+        futures = [self.executor.submit(chunk_loss_and_gradient, start, end, parameters, k) for start, end in self.chunks]
+        loss = 0.0
+        gradient = np.zeros(PARAMETERS)
+        for future in futures:
+            chunk_loss, chunk_gradient = future.result()
+            loss += chunk_loss
+            gradient += chunk_gradient
+        return loss / self.count, gradient / self.count
+
+    def fit_k(self, parameters: npt.NDArray[np.float64], low: float = 0.1, high: float = 4.0) -> float:
+        """Find the scale from centipawns to expected result that fits the current evaluation best."""
+        ratio = (math.sqrt(5) - 1) / 2
+        for _ in range(24):  # Golden section search.
+            left, right = high - ratio * (high - low), low + ratio * (high - low)
+            if self.loss_and_gradient(parameters, left)[0] < self.loss_and_gradient(parameters, right)[0]:
+                high = right
+            else:
+                low = left
+        return (low + high) / 2
+
+    def fit(self, parameters: npt.NDArray[np.float64], k: float, *, iterations: int,
+            learning_rate: float) -> npt.NDArray[np.float64]:
+        """Improve the parameters with the Adam variant of gradient descent."""
+        parameters = parameters.copy()
+        mean = np.zeros(PARAMETERS)
+        variance = np.zeros(PARAMETERS)
+        beta1, beta2 = 0.9, 0.999
+        for iteration in range(1, iterations + 1):
+            loss, gradient = self.loss_and_gradient(parameters, k)
+            mean = beta1 * mean + (1 - beta1) * gradient
+            variance = beta2 * variance + (1 - beta2) * gradient ** 2
+            step = (mean / (1 - beta1 ** iteration)) / (np.sqrt(variance / (1 - beta2 ** iteration)) + 1e-12)
+            parameters -= learning_rate * step
+            if iteration % 50 == 0 or iteration == iterations:
+                print(f"Iteration {iteration}: loss {loss:.6f}")  # noqa: T201
+        return parameters
+
+
+def format_table(name: str, values: Sequence[int]) -> str:
+    """Write a table the way `positions.py` does."""
+    rows = [", ".join(str(value) for value in values[rank * 8:rank * 8 + 8]) for rank in range(8)]
+    return f"{name} = [\n    " + ",\n    ".join(rows) + "]\n"
+
+
+def positions_source(parameters: npt.NDArray[np.float64]) -> str:
+    """Get a replacement for `positions.py` with the tables of the given parameters (less the material)."""
+    doubled_penalty, shield_bonus = round(-parameters[2 * TABLE_SIZE]), round(parameters[2 * TABLE_SIZE + 1])
+    parts = [(f"# Written by tune.py. Set DOUBLED_PAWN_PENALTY = {doubled_penalty} and SHIELD_PAWN_BONUS = {shield_bonus}"
+              " in eval.py to go with these tables.\n")]
+    for offset, suffix in ((0, "Table"), (TABLE_SIZE, "EndgameTable")):
+        for piece_type, piece_name in zip(chess.PIECE_TYPES, TABLE_NAMES, strict=True):
+            start = offset + (piece_type - 1) * 64
+            values = [round(value) - eval.PIECE_VALUES[piece_type] for value in parameters[start:start + 64]]
+            parts.append("\n" + format_table(piece_name + suffix, values))
+    with open(positions.__file__, encoding="utf-8") as source:
+        code = source.read()
+    parts.append("\n\n" + code[code.index("# The tables of each piece type"):])
+    return "".join(parts)
+
+
+def pgn_directory_from_config(config_path: str) -> str | None:
+    """Get `pgn_directory` from a lichess-bot config file, if it is set."""
+    if not os.path.exists(config_path):
+        return None
+    with open(config_path, encoding="utf-8") as config_file:
+        config = yaml.safe_load(config_file) or {}
+    directory = config.get("pgn_directory")
+    return directory if isinstance(directory, str) else None
+
+
+def main() -> None:
+    """Run the tuning step named on the command line."""
+    parser = argparse.ArgumentParser(description="Texel tuning of the homemade engine's evaluation.")
+    subparsers = parser.add_subparsers(dest="step", required=True)
+    extract_parser = subparsers.add_parser("extract", help="Collect the quiet positions of saved games.")
+    extract_parser.add_argument("--pgn-directory", help="Directory of PGN files. Defaults to pgn_directory in --config.")
+    extract_parser.add_argument("--config", default="config.yml", help="lichess-bot config to read pgn_directory from.")
+    extract_parser.add_argument("--output", default="positions.npz", help="File to write the positions to.")
+    fit_parser = subparsers.add_parser("fit", help="Fit the evaluation to the collected positions.")
+    fit_parser.add_argument("positions", help="File written by the extract step.")
+    fit_parser.add_argument("--output", default="tuned_positions.py", help="File to write the tables to.")
+    fit_parser.add_argument("--iterations", type=int, default=500, help="Steps of gradient descent.")
+    fit_parser.add_argument("--learning-rate", type=float, default=1.0, help="Step size, in centipawns.")
+    args = parser.parse_args()
+
+    if args.step == "extract":
+        pgn_directory = args.pgn_directory or pgn_directory_from_config(args.config)
+        if not pgn_directory:
+            parser.error("No PGN directory: pass --pgn-directory or set pgn_directory in the config.")
+        data = extract(pgn_directory)
+        np.savez_compressed(args.output, indices=data["indices"], signs=data["signs"], phases=data["phases"],
+                            terms=data["terms"], results=data["results"])
+        print(f"Saved {len(data['results'])} quiet positions to {args.output}")  # noqa: T201
+    elif args.step == "fit":
+        with np.load(args.positions) as saved:
+            data = {name: saved[name] for name in saved.files}
+        tuner = Tuner(data)
+        try:
+            parameters = initial_parameters()
+            k = tuner.fit_k(parameters)
+            print(f"K = {k:.3f}")  # noqa: T201
+            parameters = tuner.fit(parameters, k, iterations=args.iterations, learning_rate=args.learning_rate)
+        finally:
+            tuner.close()
+        with open(args.output, "w", encoding="utf-8") as output:
+            output.write(positions_source(parameters))
+        print(f"Wrote the tables to {args.output}")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()